@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# Answers 0-10, plus one bin for numeric answers outside that range: those still make
+# a question show up in the counts table, with zero counts
+N_BINS = 12
+OTHER = 11
+GROUPS = {"Low": 0, "Mod": 1, "High": 2}
+
+
+class AggregateCube:
+    """
+    Pre-computed answer histograms of a dataset for instant single-predicate slicing.
+
+    Built once from the unfiltered PreProcess.original_df, it holds integer histograms
+    of every question:
+      - total:        (question, bin)
+      - demographic:  (column value, question, bin) for every non-question column
+                      with at most max_levels distinct values
+      - group:        (question, Low/Mod/High, question, bin), i.e. the histograms of
+                      the respondents in each group of each question
+    histogram() answers a query with one '=' or '!=' filter, or one group filter, by
+    summing slices of these arrays and returns None for anything else so the caller
+    can fall back to the row-level path. Slicing by a question's answer is left to
+    the group filters, which keeps the demographic block linear in the questions.
+    Datasets whose cube would take more than max_bytes raise a ValueError.
+    """
+    def __init__(self, df, max_levels=50, max_bytes=64 * 2**20):
+        if df["#"].duplicated().any():
+            raise ValueError("Respondent ids must be unique to build an aggregate cube.")
+
+        self.columns = set(df.columns)
+        candidates = [col for col in df.columns if col != "#"]
+        numeric = df[candidates].apply(pd.to_numeric, errors="coerce")
+        has_numeric = numeric.notna().any()
+        # Sorted like the index of PreProcess.histogram()
+        self.questions = sorted(has_numeric[has_numeric].index)
+        self._question_index = {question: i for i, question in enumerate(self.questions)}
+
+        # Answers are truncated to integers the same way PreProcess does
+        values = np.trunc(numeric[self.questions].to_numpy(dtype=float))
+        n_rows, n_questions = values.shape
+
+        levels = {}
+        for col in candidates:
+            if col in self._question_index:
+                continue
+            codes, uniques = pd.factorize(df[col])
+            if 0 < len(uniques) <= max_levels:
+                levels[col] = (codes, uniques)
+        n_levels = sum(len(uniques) for _, uniques in levels.values())
+        n_bytes = (1 + n_levels + n_questions * len(GROUPS)) * n_questions * N_BINS * np.dtype(np.int32).itemsize
+        if n_bytes > max_bytes:
+            raise ValueError(f"Aggregate cube would take {n_bytes} bytes, more than {max_bytes}.")
+
+        rows, cols = np.nonzero(~np.isnan(values))
+        answers = values[rows, cols]
+        bins = np.where((answers >= 0) & (answers <= 10), answers, OTHER).astype(int)
+        answer_matrix = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.int64), (rows, cols * N_BINS + bins)),
+            shape=(n_rows, n_questions * N_BINS),
+        )
+        self.total = np.asarray(answer_matrix.sum(axis=0)).reshape(n_questions, N_BINS).astype(np.int32)
+
+        # One-hot respondent x (column, value) membership, multiplied by the answers
+        self.levels = {}
+        level_rows, level_cols = [], []
+        offset = 0
+        for col, (codes, uniques) in levels.items():
+            valid = codes >= 0
+            level_rows.append(np.flatnonzero(valid))
+            level_cols.append(codes[valid] + offset)
+            self.levels[col] = (offset, uniques)
+            offset += len(uniques)
+        level_rows = np.concatenate(level_rows) if level_rows else np.array([], dtype=int)
+        level_cols = np.concatenate(level_cols) if level_cols else np.array([], dtype=int)
+        level_matrix = sparse.csr_matrix(
+            (np.ones(len(level_rows), dtype=np.int64), (level_rows, level_cols)), shape=(n_rows, offset)
+        )
+        self.demographic = (
+            (level_matrix.T @ answer_matrix).toarray().reshape(offset, n_questions, N_BINS).astype(np.int32)
+        )
+
+        # One-hot respondent x (question, group) membership, multiplied by the answers
+        in_range = bins != OTHER
+        group_codes = np.select([bins <= 6, bins <= 8], [GROUPS["Low"], GROUPS["Mod"]], GROUPS["High"])
+        group_matrix = sparse.csr_matrix(
+            (
+                np.ones(in_range.sum(), dtype=np.int64),
+                (rows[in_range], cols[in_range] * len(GROUPS) + group_codes[in_range]),
+            ),
+            shape=(n_rows, n_questions * len(GROUPS)),
+        )
+        self.group = (
+            (group_matrix.T @ answer_matrix).toarray()
+            .reshape(n_questions, len(GROUPS), n_questions, N_BINS).astype(np.int32)
+        )
+        print(f"aggregate cube built: {n_questions} questions, {offset} column values")
+
+    def histogram(self, filters=None, group_filter=None):
+        """
+        The histogram PreProcess would produce for these filters, or None when the
+        query is not a single predicate covered by the cube.
+        """
+        # PreProcess ignores filters on columns that do not exist
+        filters = {col: info for col, info in (filters or {}).items() if col in self.columns}
+        if len(filters) + bool(group_filter) > 1:
+            return None
+
+        if filters:
+            (col, info), = filters.items()
+            if info["operator"] not in ("=", "!=") or col not in self.levels:
+                return None
+            offset, levels = self.levels[col]
+            matches = np.flatnonzero(pd.Series(levels) == info["value"])
+            if len(matches) == 0:
+                return None
+            counts = self.demographic[offset + matches].sum(axis=0)
+            if info["operator"] == "!=":
+                # Rows with a missing value count as != too, as in pandas
+                counts = self.total - counts
+        elif group_filter:
+            question = self._question_index.get(group_filter.get("question"))
+            group = GROUPS.get(group_filter.get("group"))
+            if question is None or group is None:
+                return None
+            counts = self.group[question, group]
+        else:
+            counts = self.total
+
+        present = counts.sum(axis=1) > 0
+        if not present.any():
+            return None
+        return pd.DataFrame(
+            counts[present, :11].astype(np.int64),
+            index=pd.Index(np.array(self.questions, dtype=object)[present], name="Question"),
+            columns=pd.Index(range(0, 11), name="Answer"),
+        )
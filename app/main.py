@@ -1,33 +1,215 @@
-from fastapi import FastAPI, UploadFile, HTTPException, Query, Depends
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Depends
 from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
+from starlette.concurrency import run_in_threadpool
 import json
-import pandas as pd
+import hashlib
+import tempfile
 import os
-from typing import Optional, Dict
-from app.utils import PreProcess, summarize, build_csv_from_typeform, get_typeforms
-from app.security import verify_api_key
+from typing import Optional, List
+from app.singleflight import SingleFlight
+from app.store import datasets
+from app.security import verify_api_key, get_api_key
 from urllib.parse import unquote
 
-app = FastAPI()
+# pandas, numpy, scipy, openai and requests are imported by app.utils and app.themes,
+# which the routes import on first use to keep worker cold starts short.
 
-@app.post("/create_counts_table")
-async def create_counts_table(
-    file: UploadFile,
-    filters: Optional[str] = Query(
-        None, description="Filters in format 'key1 operator value; key2 operator value'. Example: 'Age >= 30; Gender = Female; Avg >= 4.5'. Use semicolons to separate multiple filters."
-    ),
-    group_filter: Optional[str] = Query(
-        None, description="Filter by group membership (Low, Mod, High) for a specific question. Example: 'I am excited to work most days.:Low'"
-    ),
-    _: bool = Depends(verify_api_key),  # Move auth to the end
-):
-    if not file.filename.endswith('.csv'):
-        raise HTTPException(status_code=400, detail="File must be a CSV")
-    
+@asynccontextmanager
+async def lifespan(app):
+    get_api_key()
+    # Optionally pay the first-request costs before the worker accepts traffic
+    if os.getenv("WARM_UP", "").lower() in ("1", "true", "yes"):
+        from app.utils import warm_up
+        await run_in_threadpool(warm_up)
+    yield
+
+app = FastAPI(lifespan=lifespan)
+
+# Identical requests that arrive while one is still being computed share its result
+inflight = SingleFlight()
+
+def request_key(content, endpoint, digest=None, **params):
+    """
+    Build the coalescing key for a request: the hash of the uploaded content,
+    the endpoint name and the parsed parameters in a canonical order.
+    A stored dataset passes its id as the digest, since that is its content hash.
+    """
+    if digest is None:
+        digest = hashlib.sha256(content).hexdigest()
+    return (digest, endpoint, json.dumps(params, sort_keys=True, default=str))
+
+def write_temp_csv(content):
+    """Write uploaded bytes to a uniquely named temporary CSV and return its path"""
+    fd, temp_file = tempfile.mkstemp(prefix="temp_upload_", suffix=".csv")
+    with os.fdopen(fd, "wb") as buffer:
+        buffer.write(content)
+    return temp_file
+
+def apply_post_transform_filters(result_df, post_transform_filters):
+    if result_df is not None and not result_df.empty:
+        for col, filter_info in post_transform_filters.items():
+            op = filter_info["operator"]
+            value = filter_info["value"]
+            if col in result_df.columns:
+                result_df = result_df[eval(f"result_df[col] {op} value")]
+    return result_df
+
+def run_counts_table(content, pre_transform_filters, post_transform_filters, group_filter_dict, ci=None, confidence=0.95, n_boot=1000, weight_column=None, dataset_id=None):
+    from app.utils import PreProcess, count_table
+    # Stored datasets answer single-predicate queries from the aggregate cube built at
+    # ingest; the cube is never built on the request path
+    if dataset_id is not None and not weight_column:
+        cube = datasets.peek(dataset_id, ("cube",))
+        histogram = cube.histogram(pre_transform_filters, group_filter_dict) if cube is not None else None
+        if histogram is not None:
+            print("answered from aggregate cube")
+            result_df = count_table(histogram.reset_index(), ci=ci, confidence=confidence, n_boot=n_boot)
+            result_df = apply_post_transform_filters(result_df, post_transform_filters)
+            return result_df.to_dict(orient='records')
+
+    if content is None:
+        content = datasets.get(dataset_id)
+    temp_file = write_temp_csv(content)
+    try:
+        # Process the file with pre-transform filters
+        PP = PreProcess(temp_file, group_filter=group_filter_dict, weight_column=weight_column, **pre_transform_filters)
+        print("data back")
+        result_df = PP.count_data(ci=ci, confidence=confidence, n_boot=n_boot)
+        print("file processed")
+        # Apply post-transform filters on "Low", "Mod", "High", "Avg"
+        result_df = apply_post_transform_filters(result_df, post_transform_filters)
+        # Convert the DataFrame to a dictionary
+        return result_df.to_dict(orient='records')
+    finally:
+        os.remove(temp_file)
+
+def run_correlation_matrix(content, pre_transform_filters, post_transform_filters, group_filter_dict, weight_column=None):
+    from app.utils import PreProcess
+    temp_file = write_temp_csv(content)
+    try:
+        # Process the file with pre-transform filters
+        PP = PreProcess(temp_file, group_filter=group_filter_dict, weight_column=weight_column, **pre_transform_filters)
+        result_df = PP.correlate_data()
+        # Apply post-transform filters if they apply to the correlation matrix (ensure these filters match column names)
+        result_df = apply_post_transform_filters(result_df, post_transform_filters)
+        # Convert the DataFrame to a dictionary for JSON response
+        return result_df.to_dict(orient='records')
+    finally:
+        os.remove(temp_file)
+
+def run_driver_analysis(content, target, top_k, regression, pre_transform_filters, post_transform_filters, group_filter_dict, weight_column=None):
+    from app.utils import PreProcess
+    temp_file = write_temp_csv(content)
+    try:
+        PP = PreProcess(temp_file, group_filter=group_filter_dict, weight_column=weight_column, **pre_transform_filters)
+        result_df = PP.driver_data(target, top_k=top_k, regression=regression)
+        result_df = apply_post_transform_filters(result_df, post_transform_filters)
+        return result_df.to_dict(orient='records')
+    finally:
+        os.remove(temp_file)
+
+def dataset_histogram(dataset_id, pre_transform_filters=None, group_filter_dict=None, weight_column=None):
+    """
+    Histogram and respondents per question for a stored dataset, cached per dataset
+    and filter combination so repeated comparisons never reprocess the raw rows.
+    """
+    params = json.dumps(
+        {"filters": pre_transform_filters or {}, "group_filter": group_filter_dict, "weight_column": weight_column},
+        sort_keys=True, default=str,
+    )
+
+    def compute():
+        from app.utils import PreProcess
+        temp_file = write_temp_csv(datasets.get(dataset_id))
+        try:
+            PP = PreProcess(temp_file, group_filter=group_filter_dict, weight_column=weight_column, **(pre_transform_filters or {}))
+            histogram = PP.histogram()
+            return histogram, PP.sample_sizes().reindex(histogram.index, fill_value=0)
+        finally:
+            os.remove(temp_file)
+
+    # The unfiltered histogram is an ingest aggregate; filtered ones share the bounded cache
+    evictable = bool(pre_transform_filters or group_filter_dict or weight_column)
+    return datasets.cached(dataset_id, ("histogram", params), compute, evictable=evictable)
+
+def dataset_cube(dataset_id):
+    """
+    Aggregate cube of a stored dataset, materialized once per dataset at ingest.
+    None when the dataset cannot have one (e.g. duplicate respondent ids).
+    """
+    def compute():
+        from app.utils import PreProcess
+        from app.cube import AggregateCube
+        temp_file = write_temp_csv(datasets.get(dataset_id))
+        try:
+            return AggregateCube(PreProcess(temp_file).original_df)
+        except ValueError as e:
+            print(f"No aggregate cube for dataset {dataset_id}: {e}")
+            return None
+        finally:
+            os.remove(temp_file)
+
+    return datasets.cached(dataset_id, ("cube",), compute, evictable=False)
+
+def ingest_dataset(dataset_id):
+    """Materialize the cached aggregates of a newly stored dataset"""
+    dataset_histogram(dataset_id)
+    dataset_cube(dataset_id)
+
+def run_compare_waves(dataset_ids, alpha, pre_transform_filters, post_transform_filters, group_filter_dict, weight_column=None):
+    from app.utils import compare_waves
+    histograms, sample_sizes = [], []
+    for dataset_id in dataset_ids:
+        histogram, sizes = dataset_histogram(dataset_id, pre_transform_filters, group_filter_dict, weight_column)
+        histograms.append(histogram)
+        sample_sizes.append(sizes)
+    # Prefixed with the wave number so uploads sharing a file name stay distinct
+    labels = [f"{i + 1}: {datasets.name(dataset_id)}" for i, dataset_id in enumerate(dataset_ids)]
+    result_df = compare_waves(histograms, sample_sizes, labels, alpha=alpha)
+    result_df = apply_post_transform_filters(result_df, post_transform_filters)
+    return result_df.to_dict(orient='records')
+
+def run_themes(dataset_id, question, n_themes, top_n, segment_by, pre_transform_filters, group_filter_dict):
+    """Themes for a stored dataset, cached per dataset and parameter combination"""
+    params = json.dumps(
+        {
+            "question": question, "n_themes": n_themes, "top_n": top_n, "segment_by": segment_by,
+            "filters": pre_transform_filters, "group_filter": group_filter_dict,
+        },
+        sort_keys=True, default=str,
+    )
+
+    def compute():
+        from app.utils import PreProcess
+        from app.themes import build_themes
+        temp_file = write_temp_csv(datasets.get(dataset_id))
+        try:
+            PP = PreProcess(temp_file, group_filter=group_filter_dict, **pre_transform_filters)
+            return build_themes(PP.original_df, question, n_themes=n_themes, top_n=top_n, segment_by=segment_by)
+        finally:
+            os.remove(temp_file)
+
+    return datasets.cached(dataset_id, ("themes", params), compute)
+
+def run_summarize(content, question, group_filter_dict, parsed_filters, themes=None):
+    from app.utils import summarize
+    temp_file = write_temp_csv(content)
+    try:
+        # Since the summarize function returns a JSON string, parse it before returning
+        return json.loads(summarize(temp_file, question, group_filter=group_filter_dict, themes=themes, **parsed_filters))
+    finally:
+        os.remove(temp_file)
+
+def parse_filters(filters):
+    """
+    Parse a semicolon separated filter string ('Age >= 30; Gender = Female; Avg >= 4.5')
+    into filters applied to the raw data before transformation and filters applied to
+    the computed Low/Mod/High/Avg columns afterwards.
+    """
     # Initialize filter dictionaries
     pre_transform_filters = {}  # Filters applied before transformation
     post_transform_filters = {}  # Filters applied after transformation
-    group_filter_dict = None  # Group-based filter
 
     # Define valid operators
     valid_operators = {"=", "!=", ">=", "<=", ">", "<"}
@@ -121,7 +303,13 @@ async def create_counts_table(
                 status_code=400,
                 detail=f"Invalid filter format. Must be 'column operator value'. Error: {str(e)}"
             )
-    
+
+    return pre_transform_filters, post_transform_filters
+
+def parse_group_filter(group_filter):
+    """Parse a 'Question:Group' string into a group filter dictionary, or None if not provided"""
+    group_filter_dict = None  # Group-based filter
+
     # Parse group-based filter (if provided)
     if group_filter:
         try:
@@ -153,39 +341,68 @@ async def create_counts_table(
                 detail=f"Invalid group filter format. Must be 'Question:Group'. Error: {str(e)}"
             )
 
-    try:
-        # Create a temporary file to store the uploaded content
-        print("temp file")
-        temp_file = "temp_upload.csv"
-        with open(temp_file, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-        
-        # Process the file with pre-transform filters
-        PP = PreProcess(temp_file, group_filter=group_filter_dict, **pre_transform_filters)
-        print("data back")
-        result_df = PP.count_data() 
-        print("file processed")
-        # Apply post-transform filters on "Low", "Mod", "High", "Avg"
-        if result_df is not None and not result_df.empty:
-            for col, filter_info in post_transform_filters.items():
-                op = filter_info["operator"]
-                value = filter_info["value"]
-                if col in result_df.columns:
-                    result_df = result_df[eval(f"result_df[col] {op} value")]
+    return group_filter_dict
 
-        # Convert the DataFrame to a dictionary
-        result = result_df.to_dict(orient='records')
-        
-        # Clean up the temporary file
-        os.remove(temp_file)
-        
+@app.post("/create_counts_table")
+async def create_counts_table(
+    file: Optional[UploadFile] = None,
+    dataset_id: Optional[str] = Query(None, description="A stored dataset (see /datasets) to use instead of uploading a file"),
+    filters: Optional[str] = Query(
+        None, description="Filters in format 'key1 operator value; key2 operator value'. Example: 'Age >= 30; Gender = Female; Avg >= 4.5'. Use semicolons to separate multiple filters."
+    ),
+    group_filter: Optional[str] = Query(
+        None, description="Filter by group membership (Low, Mod, High) for a specific question. Example: 'I am excited to work most days.:Low'"
+    ),
+    ci: Optional[str] = Query(
+        None, description="Add NPS and confidence intervals for Low, Mod, High, Avg and NPS. Either 'bootstrap' or 'analytic' (Wilson / multinomial)."
+    ),
+    confidence: float = Query(0.95, gt=0, lt=1, description="Confidence level of the intervals"),
+    n_boot: int = Query(1000, ge=100, le=10000, description="Number of bootstrap resamples when ci is 'bootstrap'"),
+    weight_column: Optional[str] = Query(
+        None, description="Column holding respondent weights (e.g. post-stratification weights) used for weighted counts and correlations"
+    ),
+    _: bool = Depends(verify_api_key),  # Move auth to the end
+):
+    if file is None and dataset_id is None:
+        raise HTTPException(status_code=400, detail="Provide either a file or a dataset_id")
+    if file is not None and not file.filename.endswith('.csv'):
+        raise HTTPException(status_code=400, detail="File must be a CSV")
+    if file is None and dataset_id not in datasets:
+        raise HTTPException(status_code=404, detail=f"Dataset '{dataset_id}' not found")
+
+    from app.utils import CI_METHODS
+    if ci is not None and ci not in CI_METHODS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid ci '{ci}'. Must be 'bootstrap' or 'analytic'."
+        )
+    
+    pre_transform_filters, post_transform_filters = parse_filters(filters)
+    group_filter_dict = parse_group_filter(group_filter)
+
+    try:
+        # A stored dataset is keyed by its id; only uploads are read and hashed
+        content = await file.read() if file is not None else None
+        key = request_key(
+            content, "create_counts_table", digest=dataset_id if file is None else None,
+            pre_transform_filters=pre_transform_filters,
+            post_transform_filters=post_transform_filters,
+            group_filter=group_filter_dict,
+            ci=ci,
+            confidence=confidence,
+            n_boot=n_boot,
+            weight_column=weight_column,
+        )
+        # Uploads of an already stored dataset use its cube too (key[0] is the content hash)
+        if file is not None:
+            dataset_id = key[0] if key[0] in datasets else None
+        result = await inflight.do(
+            key, run_counts_table, content, pre_transform_filters, post_transform_filters, group_filter_dict,
+            ci, confidence, n_boot, weight_column, dataset_id
+        )
         return JSONResponse(content=result)
     
     except Exception as e:
-        # Clean up the temporary file if it exists
-        if os.path.exists("temp_upload.csv"):
-            os.remove("temp_upload.csv")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/create_correlation_matrix")
@@ -199,6 +416,9 @@ async def create_correlation_matrix(
         None, 
         description="Filter by group membership (Low, Mod, High) for a specific question. Example: 'I am excited to work most days.:Low'"
     ),
+    weight_column: Optional[str] = Query(
+        None, description="Column holding respondent weights (e.g. post-stratification weights) used for weighted counts and correlations"
+    ),
     _: bool = Depends(verify_api_key),  # Move auth to the end
 ):
     if not file.filename.endswith('.csv'):
@@ -290,36 +510,196 @@ async def create_correlation_matrix(
             )
 
     try:
-        # Create a temporary file to store the uploaded content
-        print("temp file")
-        temp_file = "temp_upload.csv"
-        with open(temp_file, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-        
-        # Process the file with pre-transform filters
-        PP = PreProcess(temp_file, group_filter=group_filter_dict, **pre_transform_filters)
-        result_df = PP.correlate_data() 
-        
-        # Apply post-transform filters if they apply to the correlation matrix (ensure these filters match column names)
-        if result_df is not None and not result_df.empty:
-            for col, filter_info in post_transform_filters.items():
-                op = filter_info["operator"]
-                value = filter_info["value"]
-                if col in result_df.columns:
-                    result_df = result_df[eval(f"result_df[col] {op} value")]
-        
-        # Convert the DataFrame to a dictionary for JSON response
-        result = result_df.to_dict(orient='records')
-        
-        # Clean up the temporary file
-        os.remove(temp_file)
-        
+        content = await file.read()
+        key = request_key(
+            content, "create_correlation_matrix",
+            pre_transform_filters=pre_transform_filters,
+            post_transform_filters=post_transform_filters,
+            group_filter=group_filter_dict,
+            weight_column=weight_column,
+        )
+        result = await inflight.do(
+            key, run_correlation_matrix, content, pre_transform_filters, post_transform_filters, group_filter_dict,
+            weight_column
+        )
         return JSONResponse(content=result)
     
     except Exception as e:
-        if os.path.exists("temp_upload.csv"):
-            os.remove("temp_upload.csv")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/driver_analysis")
+async def driver_analysis(
+    file: UploadFile,
+    target: str = Query(..., description="The outcome question to correlate every other question against. Example: 'I am excited to work most days.'"),
+    top_k: Optional[int] = Query(None, ge=1, description="Only return the k strongest drivers"),
+    regression: bool = Query(False, description="Also return standardized regression weights (Beta) of the target on all questions"),
+    weight_column: Optional[str] = Query(
+        None, description="Column holding respondent weights (e.g. post-stratification weights) used for weighted counts and correlations"
+    ),
+    filters: Optional[str] = Query(
+        None, description="Filters in format 'key1 operator value; key2 operator value'. Example: 'Age >= 30; Gender = Female'. Use semicolons to separate multiple filters."
+    ),
+    group_filter: Optional[str] = Query(
+        None, description="Filter by group membership (Low, Mod, High) for a specific question. Example: 'I am excited to work most days.:Low'"
+    ),
+    _: bool = Depends(verify_api_key),  # Move auth to the end
+):
+    if not file.filename.endswith('.csv'):
+        raise HTTPException(status_code=400, detail="File must be a CSV")
+
+    pre_transform_filters, post_transform_filters = parse_filters(filters)
+    group_filter_dict = parse_group_filter(group_filter)
+
+    try:
+        content = await file.read()
+        key = request_key(
+            content, "driver_analysis",
+            target=target,
+            top_k=top_k,
+            regression=regression,
+            pre_transform_filters=pre_transform_filters,
+            post_transform_filters=post_transform_filters,
+            group_filter=group_filter_dict,
+            weight_column=weight_column,
+        )
+        result = await inflight.do(
+            key, run_driver_analysis, content, target, top_k, regression,
+            pre_transform_filters, post_transform_filters, group_filter_dict, weight_column
+        )
+        return JSONResponse(content=result)
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/datasets")
+async def create_dataset(
+    file: UploadFile,
+    _: bool = Depends(verify_api_key),  # Move auth to the end
+):
+    """
+    Store a survey CSV so later requests can refer to it by dataset_id.
+    Its unfiltered histograms and aggregate cube are computed once here and cached.
+    """
+    if not file.filename.endswith('.csv'):
+        raise HTTPException(status_code=400, detail="File must be a CSV")
+
+    content = await file.read()
+    dataset_id = datasets.add(content, name=file.filename)
+    try:
+        await inflight.do((dataset_id, "datasets", ""), ingest_dataset, dataset_id)
+    except Exception as e:
+        datasets.remove(dataset_id)
+        raise HTTPException(status_code=400, detail=f"Could not process dataset: {str(e)}")
+
+    return {"dataset_id": dataset_id, "name": datasets.name(dataset_id)}
+
+@app.post("/compare_waves")
+async def compare_waves_endpoint(
+    files: List[UploadFile] = File([], description="Wave CSVs to compare, in wave order (after any dataset_ids)"),
+    dataset_ids: List[str] = Query([], description="Stored datasets (see /datasets) to compare, in wave order"),
+    alpha: float = Query(0.05, gt=0, lt=1, description="Significance level for the wave-over-wave tests"),
+    filters: Optional[str] = Query(
+        None, description="Filters in format 'key1 operator value; key2 operator value'. Example: 'Age >= 30; Gender = Female; Avg >= 4.5'. Use semicolons to separate multiple filters."
+    ),
+    group_filter: Optional[str] = Query(
+        None, description="Filter by group membership (Low, Mod, High) for a specific question. Example: 'I am excited to work most days.:Low'"
+    ),
+    weight_column: Optional[str] = Query(
+        None, description="Column holding respondent weights (e.g. post-stratification weights) used for weighted counts and correlations"
+    ),
+    _: bool = Depends(verify_api_key),  # Move auth to the end
+):
+    """
+    Per-question Low/Mod/High/Avg for every wave, with deltas from the previous wave
+    and significance flags. Waves are given as stored datasets and/or uploads; both
+    are compared from their cached histograms.
+    """
+    for file in files:
+        if not file.filename.endswith('.csv'):
+            raise HTTPException(status_code=400, detail="File must be a CSV")
+
+    pre_transform_filters, post_transform_filters = parse_filters(filters)
+    group_filter_dict = parse_group_filter(group_filter)
+
+    if len(dataset_ids) + len(files) < 2:
+        raise HTTPException(status_code=400, detail="At least two waves are required for a comparison")
+
+    # Uploads are kept as transient entries, so they cannot evict the stored datasets
+    upload_ids = [datasets.add(await file.read(), name=file.filename, pinned=False) for file in files]
+    for dataset_id in dataset_ids:
+        if dataset_id not in datasets:
+            raise HTTPException(status_code=404, detail=f"Dataset '{dataset_id}' not found")
+    wave_ids = list(dataset_ids) + upload_ids
+
+    try:
+        key = request_key(
+            "".join(wave_ids).encode(), "compare_waves",
+            alpha=alpha,
+            pre_transform_filters=pre_transform_filters,
+            post_transform_filters=post_transform_filters,
+            group_filter=group_filter_dict,
+            weight_column=weight_column,
+        )
+        result = await inflight.do(
+            key, run_compare_waves, wave_ids, alpha,
+            pre_transform_filters, post_transform_filters, group_filter_dict, weight_column
+        )
+        return JSONResponse(content=result)
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/themes")
+async def themes_endpoint(
+    file: Optional[UploadFile] = None,
+    dataset_id: Optional[str] = Query(None, description="A stored dataset (see /datasets) to use instead of uploading a file"),
+    question: str = Query(..., description="The open-ended question whose responses you want grouped into themes"),
+    n_themes: int = Query(5, ge=1, le=50, description="Number of themes to cluster the responses into"),
+    top_n: int = Query(10, ge=1, le=50, description="Number of top terms returned per theme and per segment"),
+    segment_by: Optional[str] = Query(None, description="Optional column (e.g. a demographic) to return top terms for each of its values"),
+    filters: Optional[str] = Query(
+        None, description="Filters in format 'key1 operator value; key2 operator value'. Example: 'Age >= 30; Gender = Female'. Use semicolons to separate multiple filters."
+    ),
+    group_filter: Optional[str] = Query(
+        None, description="Filter by group membership (Low, Mod, High) for a specific question. Example: 'I am excited to work most days.:Low'"
+    ),
+    _: bool = Depends(verify_api_key),  # Move auth to the end
+):
+    """
+    Group free-text responses into themes locally: top terms and n-grams, the share
+    of responses, a representative answer and examples per theme. No LLM call is made.
+    """
+    if file is None and dataset_id is None:
+        raise HTTPException(status_code=400, detail="Provide either a file or a dataset_id")
+    if file is not None and not file.filename.endswith('.csv'):
+        raise HTTPException(status_code=400, detail="File must be a CSV")
+    if dataset_id is not None and dataset_id not in datasets:
+        raise HTTPException(status_code=404, detail=f"Dataset '{dataset_id}' not found")
+
+    # Filters on the computed Low/Mod/High/Avg columns do not apply to free text
+    pre_transform_filters, post_transform_filters = parse_filters(filters)
+    group_filter_dict = parse_group_filter(group_filter)
+
+    if file is not None:
+        dataset_id = datasets.add(await file.read(), name=file.filename, pinned=False)
+
+    try:
+        key = request_key(
+            dataset_id.encode(), "themes",
+            question=question,
+            n_themes=n_themes,
+            top_n=top_n,
+            segment_by=segment_by,
+            pre_transform_filters=pre_transform_filters,
+            group_filter=group_filter_dict,
+        )
+        result = await inflight.do(
+            key, run_themes, dataset_id, question, n_themes, top_n, segment_by,
+            pre_transform_filters, group_filter_dict
+        )
+        return JSONResponse(content=result)
+
+    except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/summarize")
@@ -334,6 +714,10 @@ async def summarize_endpoint(
         None, 
         description="Optional group filter in format 'Question:Group'. Example: 'I am excited to work most days.:Low'"
     ),
+    themes: Optional[int] = Query(
+        None, ge=2, le=50,
+        description="Cluster the responses locally into this many themes and send one representative answer per theme instead of every answer"
+    ),
     _: bool = Depends(verify_api_key),  # Move auth to the end
 ):
     if not file.filename.endswith('.csv'):
@@ -386,28 +770,23 @@ async def summarize_endpoint(
             raise HTTPException(status_code=400, detail=f"Error parsing group filter: {str(e)}")
     
     try:
-        # Write the uploaded file to a temporary location
-        temp_file = "temp_upload.csv"
-        with open(temp_file, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-        
-        # Call the summarize function with the temporary file, question, group_filter, and filters
-        result = summarize(temp_file, question, group_filter=group_filter_dict, **parsed_filters)
-        
-        # Clean up the temporary file
-        os.remove(temp_file)
-        
-        # Since the summarize function returns a JSON string, parse it before returning
-        return JSONResponse(content=json.loads(result))
+        content = await file.read()
+        # Duplicate summaries are the most expensive to repeat: each one is a separate LLM call
+        key = request_key(
+            content, "summarize",
+            question=question,
+            filters=parsed_filters,
+            group_filter=group_filter_dict,
+            themes=themes,
+        )
+        result = await inflight.do(key, run_summarize, content, question, group_filter_dict, parsed_filters, themes)
+        return JSONResponse(content=result)
     except Exception as e:
-        # Clean up the temporary file if it still exists
-        if os.path.exists("temp_upload.csv"):
-            os.remove("temp_upload.csv")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/get_forms")
 def get_forms(_: bool = Depends(verify_api_key)):
+    from app.utils import get_typeforms
     return get_typeforms()
 
 @app.post("/get_csv")
@@ -415,4 +794,5 @@ async def get_csv(
     form_id: str,
     _: bool = Depends(verify_api_key)
 ):
+    from app.utils import build_csv_from_typeform
     return build_csv_from_typeform(form_id)
@@ -1,24 +1,31 @@
-from fastapi import HTTPException, Security, Depends
+from fastapi import HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import os
-from dotenv import load_dotenv
+from functools import lru_cache
 
-load_dotenv(override=True)
+security = HTTPBearer()
 
-API_KEY = os.getenv("API_KEY")
-print(f"Loaded API_KEY: {API_KEY}")  # Debug print
+@lru_cache(maxsize=None)
+def get_api_key():
+    """
+    Load the API key the first time it is needed rather than at import.
+    Called at startup so a missing key still stops the worker from serving.
+    """
+    from dotenv import load_dotenv
+    load_dotenv(override=True)
 
-if not API_KEY:
-    raise ValueError("API_KEY environment variable must be set")
+    api_key = os.getenv("API_KEY")
 
-security = HTTPBearer()
+    if not api_key:
+        raise ValueError("API_KEY environment variable must be set")
+    return api_key
 
 async def verify_api_key(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """
     Verify the API key from the Authorization header.
     Expects: Authorization: Bearer <api_key>
     """
-    if credentials.credentials != API_KEY:
+    if credentials.credentials != get_api_key():
         raise HTTPException(
             status_code=401,
             detail="Invalid API key",
@@ -0,0 +1,33 @@
+import asyncio
+from starlette.concurrency import run_in_threadpool
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key into a single computation.
+
+    The first caller for a key runs the function in the threadpool; callers that
+    arrive while it is still running await the same result (or exception) instead
+    of starting their own. Once the computation finishes the key is released, so
+    later calls compute afresh.
+    """
+    def __init__(self):
+        self._inflight = {}
+
+    def __len__(self):
+        return len(self._inflight)
+
+    async def do(self, key, fn, *args, **kwargs):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(run_in_threadpool(fn, *args, **kwargs))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._release(key, t))
+        else:
+            print("Joining in-flight computation")
+        # Shield so that one caller disconnecting does not cancel the shared work
+        return await asyncio.shield(task)
+
+    def _release(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
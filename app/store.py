@@ -0,0 +1,117 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+
+class DatasetStore:
+    """
+    In-memory store of uploaded datasets keyed by the SHA-256 of their content.
+
+    Each dataset keeps a cache of results derived from it (histograms, themes, ...),
+    so repeated views of the same survey reuse earlier work instead of reprocessing
+    the raw rows. Per-query results are an LRU of at most max_cached entries per
+    dataset; the aggregates computed at ingest are kept for the dataset's lifetime.
+    Datasets saved through /datasets are pinned; one-off uploads to
+    other endpoints are transient and bounded separately, so they can never push a
+    pinned dataset out. Within each kind the least recently used datasets are
+    evicted, together with their caches, once more than the limit are held.
+    """
+    def __init__(self, max_datasets=32, max_transient=8, max_cached=64):
+        self.max_datasets = max_datasets
+        self.max_transient = max_transient
+        self.max_cached = max_cached
+        self._datasets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, dataset_id):
+        with self._lock:
+            return dataset_id in self._datasets
+
+    def __len__(self):
+        with self._lock:
+            return len(self._datasets)
+
+    def add(self, content, name=None, pinned=True):
+        """
+        Store the content (if not already stored) and return its dataset id.
+        Pinning a transient dataset promotes it; a pinned one stays pinned.
+        """
+        dataset_id = hashlib.sha256(content).hexdigest()
+        with self._lock:
+            if dataset_id in self._datasets:
+                entry = self._datasets[dataset_id]
+                self._datasets.move_to_end(dataset_id)
+                if name and not entry["name"]:
+                    entry["name"] = name
+                entry["pinned"] = entry["pinned"] or pinned
+            else:
+                self._datasets[dataset_id] = {
+                    "content": content, "name": name, "cache": OrderedDict(), "aggregates": {}, "pinned": pinned,
+                }
+            self._evict()
+        return dataset_id
+
+    def _evict(self):
+        for pinned, limit in ((True, self.max_datasets), (False, self.max_transient)):
+            ids = [dataset_id for dataset_id, entry in self._datasets.items() if entry["pinned"] == pinned]
+            for evicted in ids[:max(0, len(ids) - limit)]:
+                del self._datasets[evicted]
+                print(f"Evicted dataset {evicted}")
+
+    def remove(self, dataset_id):
+        with self._lock:
+            self._datasets.pop(dataset_id, None)
+
+    def _entry(self, dataset_id):
+        with self._lock:
+            if dataset_id not in self._datasets:
+                raise KeyError(f"Dataset '{dataset_id}' not found. Upload it to /datasets first.")
+            self._datasets.move_to_end(dataset_id)
+            return self._datasets[dataset_id]
+
+    def get(self, dataset_id):
+        """Return the raw content of a stored dataset"""
+        return self._entry(dataset_id)["content"]
+
+    def name(self, dataset_id):
+        return self._entry(dataset_id)["name"] or dataset_id[:12]
+
+    def peek(self, dataset_id, key, default=None):
+        """Return the cached result stored under key without computing it"""
+        with self._lock:
+            entry = self._datasets.get(dataset_id)
+            if entry is None:
+                return default
+            if key in entry["aggregates"]:
+                return entry["aggregates"][key]
+            return entry["cache"].get(key, default)
+
+    def cached(self, dataset_id, key, compute, evictable=True):
+        """
+        Return the cached result stored under key for this dataset, calling
+        compute() to fill the cache on a miss. Results with evictable=False are
+        kept as long as the dataset is, the others share the bounded LRU.
+        """
+        entry = self._entry(dataset_id)
+        cache = entry["cache"] if evictable else entry["aggregates"]
+        with self._lock:
+            if key in cache:
+                if evictable:
+                    cache.move_to_end(key)
+                return cache[key]
+        result = compute()
+        with self._lock:
+            cache[key] = result
+            if evictable:
+                cache.move_to_end(key)
+                while len(cache) > self.max_cached:
+                    cache.popitem(last=False)
+        return result
+
+
+datasets = DatasetStore(
+    max_datasets=int(os.getenv("DATASET_STORE_SIZE", "32")),
+    max_transient=int(os.getenv("TRANSIENT_STORE_SIZE", "8")),
+    max_cached=int(os.getenv("DATASET_CACHE_SIZE", "64")),
+)
@@ -0,0 +1,176 @@
+import re
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9']*")
+
+STOP_WORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below between
+both but by can could did do does doing don down during each few for from further had has have having he her
+here hers herself him himself his how i if in into is it its itself just me more most my myself no nor not now
+of off on once only or other our ours ourselves out over own same she should so some such than that the their
+theirs them themselves then there these they this those through to too under until up very was we were what
+when where which while who whom why will with would you your yours yourself yourselves also get got really
+much many lot lots make makes made things thing one im ive dont its
+""".split())
+
+
+def tokenize(text):
+    """Lowercase word tokens with stop words and single characters removed"""
+    tokens = (token.strip("'") for token in TOKEN_PATTERN.findall(str(text).lower()))
+    return [token for token in tokens if len(token) > 1 and token not in STOP_WORDS]
+
+
+def document_terms(text):
+    """Unigrams and bigrams of a single answer"""
+    tokens = tokenize(text)
+    return tokens + [f"{first} {second}" for first, second in zip(tokens, tokens[1:])]
+
+
+def term_document_matrix(texts, min_df=2, max_features=5000):
+    """
+    TF-IDF weighted sparse document-term matrix with L2 normalized rows.
+    Terms used by fewer than min_df answers are dropped (unless that would drop
+    everything) and only the max_features most common terms are kept.
+    Returns the matrix and the array of terms for its columns.
+    """
+    vocabulary = {}
+    rows, cols = [], []
+    for i, text in enumerate(texts):
+        for term in document_terms(text):
+            rows.append(i)
+            cols.append(vocabulary.setdefault(term, len(vocabulary)))
+    terms = np.array(list(vocabulary), dtype=object)
+
+    counts = sparse.csr_matrix(
+        (np.ones(len(rows)), (rows, cols)), shape=(len(texts), len(terms))
+    )
+    counts.sum_duplicates()
+    doc_freq = np.bincount(counts.indices, minlength=len(terms))
+
+    keep = doc_freq >= min_df
+    if not keep.any():
+        keep = doc_freq > 0
+    keep = np.flatnonzero(keep)
+    if len(keep) > max_features:
+        keep = keep[np.argsort(-doc_freq[keep], kind="stable")[:max_features]]
+    counts, terms, doc_freq = counts[:, keep], terms[keep], doc_freq[keep]
+
+    idf = np.log((1 + len(texts)) / (1 + doc_freq)) + 1
+    tfidf = sparse.csr_matrix(counts.multiply(idf))
+    norms = np.sqrt(np.asarray(tfidf.multiply(tfidf).sum(axis=1))).ravel()
+    tfidf = sparse.diags(1 / np.where(norms > 0, norms, 1)) @ tfidf
+    return sparse.csr_matrix(tfidf), terms
+
+
+def spherical_kmeans(matrix, k, n_iter=25, seed=0):
+    """
+    Cluster L2 normalized rows by cosine similarity. Centroids are seeded with
+    k-means++ and every iteration is one sparse-dense product.
+    Returns the labels, the centroids and each row's similarity to its centroid.
+    """
+    n = matrix.shape[0]
+    k = max(1, min(k, n))
+    rng = np.random.default_rng(seed)
+
+    chosen = [rng.integers(n)]
+    best = (matrix @ matrix[chosen[0]].T).toarray().ravel()
+    for _ in range(1, k):
+        distance = np.clip(1 - best, 0, None)
+        if distance.sum() == 0:
+            break
+        chosen.append(rng.choice(n, p=distance / distance.sum()))
+        best = np.maximum(best, (matrix @ matrix[chosen[-1]].T).toarray().ravel())
+    centroids = matrix[chosen].toarray()
+
+    labels = None
+    for _ in range(n_iter):
+        similarity = np.asarray(matrix @ centroids.T)
+        new_labels = similarity.argmax(axis=1)
+        if labels is not None and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        membership = sparse.csr_matrix(
+            (np.ones(n), (labels, np.arange(n))), shape=(len(centroids), n)
+        )
+        sums = np.asarray((membership @ matrix).todense())
+        norms = np.linalg.norm(sums, axis=1)
+        # Empty clusters keep their previous centroid
+        filled = norms > 0
+        centroids[filled] = sums[filled] / norms[filled, None]
+
+    similarity = np.asarray(matrix @ centroids.T)
+    labels = similarity.argmax(axis=1)
+    return labels, centroids, similarity[np.arange(n), labels]
+
+
+def top_terms(weights, terms, top_n):
+    order = np.argsort(-weights, kind="stable")[:top_n]
+    return [terms[i] for i in order if weights[i] > 0]
+
+
+def build_themes(df, question, n_themes=5, top_n=10, segment_by=None, n_examples=3, seed=0):
+    """
+    Local lexical themes for an open-ended question: answers are clustered on a
+    TF-IDF matrix of unigrams and bigrams, and every theme is described by its top
+    terms, its share of answers, the most representative answer and a few examples.
+    With segment_by, the top terms of each value of that column are returned too.
+    """
+    if question not in df.columns:
+        raise ValueError(f"Question '{question}' not found in dataset.")
+    if segment_by and segment_by not in df.columns:
+        raise ValueError(f"Segment column '{segment_by}' not found in dataset.")
+
+    answers = df[question].dropna().astype(str).str.strip()
+    answers = answers[answers != ""]
+    if answers.empty:
+        raise ValueError(f"No responses found for question: {question}")
+
+    matrix, terms = term_document_matrix(answers.tolist())
+    # Answers made only of stop words carry no terms and are left out of the themes
+    has_terms = matrix.getnnz(axis=1) > 0
+    texts = answers[has_terms].tolist()
+    matrix = matrix[has_terms]
+
+    themes = []
+    if len(texts) > 0:
+        labels, centroids, similarity = spherical_kmeans(matrix, n_themes, seed=seed)
+        for theme in np.unique(labels):
+            members = np.flatnonzero(labels == theme)
+            ranked = members[np.argsort(-similarity[members], kind="stable")]
+            themes.append({
+                "size": int(len(members)),
+                "share": round(len(members) / len(texts), 2),
+                "top_terms": top_terms(centroids[theme], terms, top_n),
+                "representative": texts[ranked[0]],
+                "examples": list(dict.fromkeys(texts[i] for i in ranked))[:n_examples],
+            })
+        themes.sort(key=lambda theme: theme["size"], reverse=True)
+        themes = [{"theme": i + 1, **theme} for i, theme in enumerate(themes)]
+
+    result = {
+        "question": question,
+        "n_responses": int(len(answers)),
+        "themes": themes,
+    }
+
+    if segment_by:
+        segments = df.loc[answers.index[has_terms], segment_by].astype(str).to_numpy()
+        codes, values = pd.factorize(segments, sort=True)
+        membership = sparse.csr_matrix(
+            (np.ones(len(codes)), (codes, np.arange(len(codes)))), shape=(len(values), len(codes))
+        )
+        weights = np.asarray((membership @ matrix).todense())
+        sizes = np.bincount(codes, minlength=len(values))
+        result["segments"] = [
+            {
+                "segment": value,
+                "n_responses": int(sizes[i]),
+                "top_terms": top_terms(weights[i], terms, top_n),
+            }
+            for i, value in enumerate(values)
+        ]
+
+    print("themes computed")
+    return result
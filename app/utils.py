@@ -1,19 +1,48 @@
 import pandas as pd
+import numpy as np
 import operator
-from openai import OpenAI
 import os
-from dotenv import load_dotenv
 import json
-import requests
-load_dotenv()
+import threading
+from statistics import NormalDist
+from concurrent.futures import ProcessPoolExecutor
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-TYPEFORM_API_KEY = os.getenv("TYPEFORM_API_KEY")
 base_url = "https://api.typeform.com"
 
+# API clients are built on first use so importing this module stays cheap
+_client = None
+_typeform_session = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """The OpenAI client, constructed on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from dotenv import load_dotenv
+                from openai import OpenAI
+                load_dotenv()
+                _client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return _client
+
+def get_typeform_session():
+    """A requests session authorized for the Typeform API, constructed on first use"""
+    global _typeform_session
+    if _typeform_session is None:
+        with _client_lock:
+            if _typeform_session is None:
+                from dotenv import load_dotenv
+                import requests
+                load_dotenv()
+                session = requests.Session()
+                session.headers["Authorization"] = f"Bearer {os.getenv('TYPEFORM_API_KEY')}"
+                _typeform_session = session
+    return _typeform_session
+
 class PreProcess:
     """Pre-process CSV and perform various operations"""
-    def __init__(self, filename, group_filter=None, **filters):
+    def __init__(self, filename, group_filter=None, weight_column=None, **filters):
         print("PreProcess initialization started")
         print("Received filters:", filters)
         df = pd.read_csv(filename)
@@ -27,6 +56,15 @@ class PreProcess:
         df.columns = df.columns.str.strip()
         print("Trimmed DataFrame columns:", df.columns.tolist())
 
+        # Respondent weights (e.g. post-stratification) are carried alongside every answer
+        self.weight_column = weight_column
+        if weight_column:
+            if weight_column not in df.columns:
+                raise ValueError(f"Weight column '{weight_column}' not found in dataset.")
+            df[weight_column] = pd.to_numeric(df[weight_column], errors='coerce').fillna(0.0)
+            if (df[weight_column] < 0).any():
+                raise ValueError(f"Weight column '{weight_column}' contains negative weights.")
+
         # Store original dataframe before numeric filtering
         self.original_df = df.copy()
 
@@ -98,7 +136,11 @@ class PreProcess:
         self.original_df = self.original_df[self.original_df["#"].isin(respondent_ids)]
         
         # Create melted dataframe for numeric analysis
-        df_numeric = self.original_df.melt(id_vars=["#"], var_name="Question", value_name="Answer")
+        if weight_column:
+            df_numeric = self.original_df.melt(id_vars=["#", weight_column], var_name="Question", value_name="Answer")
+            df_numeric.rename(columns={weight_column: "Weight"}, inplace=True)
+        else:
+            df_numeric = self.original_df.melt(id_vars=["#"], var_name="Question", value_name="Answer")
         df_numeric['Answer'] = pd.to_numeric(df_numeric['Answer'], errors='coerce')
         # Only drop NA for numeric answers while keeping text responses
         self.df_melt = df_numeric
@@ -108,28 +150,72 @@ class PreProcess:
         self.df_melt_numeric.loc[:, "Answer"] = self.df_melt_numeric["Answer"].astype(int)
         print("melt done")
 
-    def count_data(self):
-        try:
+    def histogram(self):
+        """
+        Answer counts per question: one row per question, one column per answer from 0 to 10.
+        With a weight column the counts are sums of respondent weights.
+        """
+        if not self.weight_column:
             df_pivot = self.df_melt_numeric.pivot_table(index='Question', columns='Answer', aggfunc='size', fill_value=0)
-            df_pivot = df_pivot.reindex(columns=list(range(0, 11)), fill_value=0)
+            return df_pivot.reindex(columns=list(range(0, 11)), fill_value=0)
+
+        # Weighted bincount over (question, answer) cells
+        codes, questions = pd.factorize(self.df_melt_numeric["Question"], sort=True)
+        answers = self.df_melt_numeric["Answer"].to_numpy(dtype=int)
+        weights = self.df_melt_numeric["Weight"].to_numpy(dtype=float)
+        in_range = (answers >= 0) & (answers <= 10)
+        counts = np.bincount(
+            codes[in_range] * 11 + answers[in_range],
+            weights=weights[in_range],
+            minlength=len(questions) * 11,
+        )
+        return pd.DataFrame(
+            counts.reshape(len(questions), 11),
+            index=pd.Index(questions, name="Question"),
+            columns=pd.Index(range(0, 11), name="Answer"),
+        )
+
+    def sample_sizes(self):
+        """
+        Effective number of respondents per question. Without
+        weights this is the raw count; with weights it is Kish's (sum w)^2 / sum w^2.
+        """
+        df = self.df_melt_numeric[self.df_melt_numeric["Answer"].between(0, 10)]
+        if not self.weight_column:
+            return df.groupby("Question").size()
+        weights = df["Weight"]
+        sums = weights.groupby(df["Question"]).sum()
+        squares = (weights ** 2).groupby(df["Question"]).sum()
+        return (sums ** 2 / squares.replace(0, np.nan)).fillna(0.0)
+
+    def wide_data(self):
+        """
+        Respondents as rows and questions as columns, plus the respondent weights
+        aligned with the rows (None when unweighted).
+        """
+        df_wide = self.df_melt_numeric.pivot(index="#", columns="Question", values="Answer")
+        if not self.weight_column:
+            return df_wide, None
+        weights = self.df_melt_numeric.groupby("#")["Weight"].first().reindex(df_wide.index)
+        return df_wide, weights.to_numpy(dtype=float)
+
+    def count_data(self, ci=None, confidence=0.95, n_boot=1000, n_jobs=None, seed=0):
+        """
+        Counts table with Low/Mod/High/Avg/STD per question. When ci is 'bootstrap' or
+        'analytic', NPS (High - Low) and lower/upper confidence bounds for Low, Mod,
+        High, Avg and NPS are added, all computed from the 0-10 histograms.
+        """
+        try:
+            df_pivot = self.histogram()
+            sample_sizes = None
+            if self.weight_column and ci:
+                sample_sizes = self.sample_sizes().reindex(df_pivot.index, fill_value=0).to_numpy(dtype=float)
             df_pivot.reset_index(inplace=True)
             print("pivot done")
-
-            # Compute final categorical percentages
-            total_counts = df_pivot.loc[:, range(0, 11)].sum(axis=1).replace(0, 1)
-            df_pivot["STD"] = df_pivot.loc[:, range(0, 11)].std(axis=1).round(2)
-            df_pivot["Low"] = round(df_pivot.loc[:, range(0, 7)].sum(axis=1) / total_counts, 2)
-            df_pivot["Mod"] = round(df_pivot.loc[:, range(7, 9)].sum(axis=1) / total_counts, 2)
-            df_pivot["High"] = round(df_pivot.loc[:, range(9, 11)].sum(axis=1) / total_counts, 2)
-            df_pivot["Avg"] = round(
-                (df_pivot.loc[:, range(0, 11)] * pd.Series(range(0, 11), index=range(0, 11))).sum(axis=1) / total_counts, 2
+            return count_table(
+                df_pivot, ci=ci, confidence=confidence, n_boot=n_boot, n_jobs=n_jobs, seed=seed,
+                sample_sizes=sample_sizes,
             )
-
-            # Ensure all computed columns exist and have float type
-            for col in ["Low", "Mod", "High", "Avg"]:
-                df_pivot[col] = df_pivot[col].astype(float).fillna(0.0)
-
-            return df_pivot
         except Exception as e:
             print(e)
             return None
@@ -138,23 +224,370 @@ class PreProcess:
         """
         Pivot the melted DataFrame to a wide format with respondents as rows and questions as columns,
         then compute and return the correlation matrix of the numeric responses.
+        With a weight column the correlations are weighted Pearson correlations.
         """
         try:
             # Pivot wide: rows are respondents, columns are questions, values are answers
-            df_wide = self.df_melt_numeric.pivot(index="#", columns="Question", values="Answer")
+            df_wide, weights = self.wide_data()
             # Compute correlation matrix for the questions
-            correlation_matrix = df_wide.corr()
+            if weights is None:
+                correlation_matrix = df_wide.corr()
+            else:
+                X = df_wide.to_numpy(dtype=float)
+                correlations, _ = pairwise_corr(X, X, weights=weights)
+                correlation_matrix = pd.DataFrame(correlations, index=df_wide.columns, columns=df_wide.columns)
             print("correlation matrix computed")
             return correlation_matrix
         except Exception as e:
             print(e)
             return None
 
-def summarize(filename, question, group_filter=None, **filters):
+    def driver_data(self, target, top_k=None, regression=False):
+        """
+        Key-driver analysis: correlate every question against a single target question
+        instead of building the full question-by-question matrix. Optionally adds
+        standardized regression weights of the target on all other questions.
+        Returns one row per driver sorted by the strength of its correlation.
+        """
+        # Pivot wide: rows are respondents, columns are questions, values are answers
+        df_wide, weights = self.wide_data()
+        if target not in df_wide.columns:
+            raise ValueError(f"Target question '{target}' not found in numeric responses.")
+
+        drivers = df_wide.drop(columns=[target])
+        X = drivers.to_numpy(dtype=float)
+        y = df_wide[target].to_numpy(dtype=float)
+
+        correlations, counts = pairwise_corr(X, y[:, None], weights=weights)
+        result = pd.DataFrame({
+            "Question": drivers.columns,
+            "Correlation": correlations[:, 0],
+            "N": counts[:, 0].astype(int),
+        })
+        if regression:
+            # Betas that cannot be estimated (constant questions) are returned as null
+            betas = standardized_betas(X, y, weights=weights)
+            result["Beta"] = pd.Series(betas, dtype=object).where(~np.isnan(betas), None)
+
+        result = result.dropna(subset=["Correlation"])
+        result = result.loc[result["Correlation"].abs().sort_values(ascending=False).index]
+        if top_k:
+            result = result.head(top_k)
+        print("driver analysis computed")
+        return result.reset_index(drop=True)
+
+CI_METHODS = {"bootstrap", "analytic"}
+CI_STATS = ["Low", "Mod", "High", "Avg", "NPS"]
+MAX_BOOTSTRAP_RESAMPLES = 10000
+# Resamples drawn per batch, to bound the memory of the (batch, questions, 11) draw array
+BOOTSTRAP_BATCH_SIZE = 2000
+# Resampled stats are tallied on a fixed grid instead of being kept: proportions and NPS
+# to 1/10000, Avg to 1/1000, far finer than the 2 decimals they are reported with
+BOOTSTRAP_GRID = {"Low": (0.0, 1e4), "Mod": (0.0, 1e4), "High": (0.0, 1e4), "Avg": (0.0, 1e3), "NPS": (-1.0, 5e3)}
+BOOTSTRAP_GRID_SIZE = 10001
+# Worker processes for bootstrap resampling; the shared pool is only used when this is above 1
+BOOTSTRAP_WORKERS = int(os.getenv("BOOTSTRAP_WORKERS", "1"))
+_bootstrap_pool = None
+_bootstrap_pool_lock = threading.Lock()
+
+def count_table(df_pivot, ci=None, confidence=0.95, n_boot=1000, n_jobs=None, seed=0, sample_sizes=None):
+    """
+    Compute Low/Mod/High/Avg/STD (and optionally confidence intervals) from a
+    histogram DataFrame with a 'Question' column and answer columns 0-10.
+    sample_sizes overrides the histogram totals as the number of respondents
+    behind each interval, which matters when the histograms are weighted.
+    """
+    # Compute final categorical percentages
+    total_counts = df_pivot.loc[:, range(0, 11)].sum(axis=1).replace(0, 1)
+    df_pivot["STD"] = df_pivot.loc[:, range(0, 11)].std(axis=1).round(2)
+    df_pivot["Low"] = round(df_pivot.loc[:, range(0, 7)].sum(axis=1) / total_counts, 2)
+    df_pivot["Mod"] = round(df_pivot.loc[:, range(7, 9)].sum(axis=1) / total_counts, 2)
+    df_pivot["High"] = round(df_pivot.loc[:, range(9, 11)].sum(axis=1) / total_counts, 2)
+    df_pivot["Avg"] = round(
+        (df_pivot.loc[:, range(0, 11)] * pd.Series(range(0, 11), index=range(0, 11))).sum(axis=1) / total_counts, 2
+    )
+
+    # Ensure all computed columns exist and have float type
+    for col in ["Low", "Mod", "High", "Avg"]:
+        df_pivot[col] = df_pivot[col].astype(float).fillna(0.0)
+
+    if ci:
+        counts = df_pivot.loc[:, range(0, 11)].to_numpy(dtype=float)
+        df_pivot["NPS"] = round(pd.Series(histogram_stats(counts)["NPS"], index=df_pivot.index), 2)
+        if ci == "bootstrap":
+            bounds = bootstrap_intervals(
+                counts, sample_sizes, confidence=confidence, n_boot=n_boot, n_jobs=n_jobs, seed=seed
+            )
+        elif ci == "analytic":
+            bounds = analytic_intervals(counts, sample_sizes, confidence=confidence)
+        else:
+            raise ValueError(f"Invalid ci method '{ci}'. Must be one of {sorted(CI_METHODS)}.")
+        for stat in CI_STATS:
+            lower, upper = bounds[stat]
+            df_pivot[f"{stat}_Lower"] = np.round(np.nan_to_num(lower), 2)
+            df_pivot[f"{stat}_Upper"] = np.round(np.nan_to_num(upper), 2)
+        print("confidence intervals computed")
+
+    return df_pivot
+
+def histogram_stats(counts):
+    """
+    Low/Mod/High/Avg/NPS for histograms stored along the last axis (answers 0-10)
+    of an array of any shape. Empty histograms give 0.
+    """
+    n = counts.sum(axis=-1)
+    safe_n = np.where(n > 0, n, 1)
+    low = counts[..., 0:7].sum(axis=-1) / safe_n
+    high = counts[..., 9:11].sum(axis=-1) / safe_n
+    return {
+        "Low": low,
+        "Mod": counts[..., 7:9].sum(axis=-1) / safe_n,
+        "High": high,
+        "Avg": (counts * np.arange(11)).sum(axis=-1) / safe_n,
+        "NPS": high - low,
+    }
+
+def _bootstrap_tallies(counts, n, n_boot, seed):
+    """
+    Resample every question's histogram n_boot times and tally the stats of the
+    resamples on BOOTSTRAP_GRID. Returns a (stat, question, grid) array of counts,
+    so memory does not grow with n_boot.
+    """
+    rng = np.random.default_rng(seed)
+    totals = counts.sum(axis=1)
+    n = np.where(totals > 0, np.round(n), 0).astype(int)
+    p = counts / np.where(totals > 0, totals, 1)[:, None]
+    p[n == 0] = 1 / 11  # multinomial needs valid probabilities; draws of size 0 are empty anyway
+    n_questions = len(n)
+    offsets = np.arange(n_questions)[None, :] * BOOTSTRAP_GRID_SIZE
+    tallies = np.zeros((len(CI_STATS), n_questions * BOOTSTRAP_GRID_SIZE), dtype=np.int64)
+    for size in np.diff(np.r_[0:n_boot:BOOTSTRAP_BATCH_SIZE, n_boot]):
+        stats = histogram_stats(rng.multinomial(n, p, size=(size, n_questions)))
+        for i, stat in enumerate(CI_STATS):
+            low, scale = BOOTSTRAP_GRID[stat]
+            codes = np.clip(np.rint((stats[stat] - low) * scale), 0, BOOTSTRAP_GRID_SIZE - 1).astype(np.int64)
+            tallies[i] += np.bincount((codes + offsets).ravel(), minlength=tallies.shape[1])
+    return tallies.reshape(len(CI_STATS), n_questions, BOOTSTRAP_GRID_SIZE)
+
+def get_bootstrap_pool(workers):
+    """Process pool shared by all bootstrap requests, created on first use"""
+    global _bootstrap_pool
+    if _bootstrap_pool is None:
+        with _bootstrap_pool_lock:
+            if _bootstrap_pool is None:
+                _bootstrap_pool = ProcessPoolExecutor(max_workers=workers)
+    return _bootstrap_pool
+
+def bootstrap_intervals(counts, n=None, confidence=0.95, n_boot=1000, n_jobs=None, seed=0):
+    """
+    Percentile bootstrap intervals from multinomial resamples of each question's
+    histogram, vectorized over questions and resamples. Each resample has n draws
+    (the histogram total by default). Quantiles are read from the cumulative tallies
+    of the resampled stats. With n_jobs > 1 (default BOOTSTRAP_WORKERS) resampling
+    is split across the shared process pool.
+    """
+    if n is None:
+        n = counts.sum(axis=1)
+    if n_boot > MAX_BOOTSTRAP_RESAMPLES:
+        raise ValueError(f"n_boot must be at most {MAX_BOOTSTRAP_RESAMPLES}.")
+    if n_jobs is None:
+        n_jobs = BOOTSTRAP_WORKERS
+    n_jobs = max(1, min(n_jobs, n_boot))
+    seeds = np.random.SeedSequence(seed).spawn(n_jobs)
+    if n_jobs == 1:
+        tallies = _bootstrap_tallies(counts, n, n_boot, seeds[0])
+    else:
+        sizes = [len(chunk) for chunk in np.array_split(np.arange(n_boot), n_jobs)]
+        pool = get_bootstrap_pool(n_jobs)
+        tallies = sum(pool.map(_bootstrap_tallies, [counts] * n_jobs, [n] * n_jobs, sizes, seeds))
+
+    alpha = (1 - confidence) / 2
+    cumulative = tallies.cumsum(axis=2)
+    bounds = {}
+    for i, stat in enumerate(CI_STATS):
+        low, scale = BOOTSTRAP_GRID[stat]
+        # Smallest grid value whose cumulative share reaches each quantile
+        lower = (cumulative[i] >= alpha * n_boot).argmax(axis=1) / scale + low
+        upper = (cumulative[i] >= (1 - alpha) * n_boot).argmax(axis=1) / scale + low
+        bounds[stat] = (lower, upper)
+    return bounds
+
+def analytic_intervals(counts, n=None, confidence=0.95):
+    """
+    Normal-theory intervals: Wilson score intervals for Low/Mod/High, a normal interval
+    for Avg and the multinomial variance of High - Low for NPS. n is the number of
+    respondents behind each histogram (the histogram total by default).
+    """
+    z = NormalDist().inv_cdf(1 - (1 - confidence) / 2)
+    totals = counts.sum(axis=1)
+    if n is None:
+        n = totals
+    n = np.where(totals > 0, n, 0)
+    safe_n = np.where(n > 0, n, 1)
+    stats = histogram_stats(counts)
+    bounds = {}
+
+    for stat in ["Low", "Mod", "High"]:
+        p = stats[stat]
+        denom = 1 + z ** 2 / safe_n
+        center = (p + z ** 2 / (2 * safe_n)) / denom
+        half = z * np.sqrt(p * (1 - p) / safe_n + z ** 2 / (4 * safe_n ** 2)) / denom
+        bounds[stat] = (center - half, center + half)
+
+    variance = (counts * (np.arange(11) - stats["Avg"][:, None]) ** 2).sum(axis=1) / np.where(totals > 0, totals, 1)
+    sd = np.sqrt(variance * safe_n / np.where(n > 1, n - 1, 1))
+    half = z * sd / np.sqrt(safe_n)
+    bounds["Avg"] = (np.clip(stats["Avg"] - half, 0, 10), np.clip(stats["Avg"] + half, 0, 10))
+
+    nps = stats["NPS"]
+    var = np.clip(stats["High"] + stats["Low"] - nps ** 2, 0, None) / safe_n
+    half = z * np.sqrt(var)
+    bounds["NPS"] = (np.clip(nps - half, -1, 1), np.clip(nps + half, -1, 1))
+
+    for stat in CI_STATS:
+        lower, upper = bounds[stat]
+        bounds[stat] = (np.where(n > 0, lower, 0.0), np.where(n > 0, upper, 0.0))
+    return bounds
+
+WAVE_STATS = ["Low", "Mod", "High", "Avg"]
+
+def compare_waves(histograms, sample_sizes, labels, alpha=0.05):
+    """
+    Compare Low/Mod/High/Avg per question across survey waves, working only from
+    each wave's histogram (questions x answers 0-10) and respondents per question.
+    Questions are aligned by name. Each wave is compared with the previous wave
+    that has the question: Low/Mod/High with a two-proportion z-test and Avg with a
+    z-test on the difference in means. Deltas are null for the first wave.
+    """
+    questions = list(dict.fromkeys(q for hist in histograms for q in hist.index))
+    counts = np.stack([hist.reindex(questions).to_numpy(dtype=float) for hist in histograms])
+    present = ~np.isnan(counts).all(axis=2)
+    counts = np.nan_to_num(counts)
+    n = np.stack([sizes.reindex(questions).fillna(0).to_numpy(dtype=float) for sizes in sample_sizes])
+    n_waves, n_questions = present.shape
+
+    stats = histogram_stats(counts)
+    totals = counts.sum(axis=2)
+    safe_n = np.where(n > 0, n, 1)
+    variance = (
+        (counts * (np.arange(11) - stats["Avg"][..., None]) ** 2).sum(axis=2) / np.where(totals > 0, totals, 1)
+        * safe_n / np.where(n > 1, n - 1, 1)
+    )
+    z_crit = NormalDist().inv_cdf(1 - alpha / 2)
+
+    # Pair every wave with the last earlier wave that has the question
+    previous = np.full((n_waves, n_questions), -1)
+    last_seen = np.full(n_questions, -1)
+    for wave in range(n_waves):
+        previous[wave] = last_seen
+        last_seen = np.where(present[wave] & (n[wave] > 0), wave, last_seen)
+    comparable = present & (n > 0) & (previous >= 0)
+    prev_index = np.where(previous >= 0, previous, 0)
+    columns = np.arange(n_questions)
+
+    n_prev = n[prev_index, columns]
+    result = pd.DataFrame({
+        "Question": np.tile(questions, n_waves),
+        "Wave": np.repeat(labels, n_questions),
+        "N": np.round(n, 2).ravel(),
+    })
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for stat in WAVE_STATS:
+            current = stats[stat]
+            earlier = current[prev_index, columns]
+            delta = current - earlier
+            if stat == "Avg":
+                se = np.sqrt(variance / safe_n + variance[prev_index, columns] / np.where(n_prev > 0, n_prev, 1))
+            else:
+                pooled = (current * n + earlier * n_prev) / np.where(n + n_prev > 0, n + n_prev, 1)
+                se = np.sqrt(pooled * (1 - pooled) * (1 / safe_n + 1 / np.where(n_prev > 0, n_prev, 1)))
+            significant = (se > 0) & (np.abs(delta) > z_crit * se)
+
+            result[stat] = np.round(current, 2).ravel()
+            result[f"{stat}_Delta"] = pd.Series(np.round(delta, 2).ravel(), dtype=object).where(comparable.ravel(), None)
+            result[f"{stat}_Significant"] = pd.Series(significant.ravel(), dtype=object).where(comparable.ravel(), None)
+
+    # One block of waves per question, in order of first appearance
+    result["order"] = np.tile(np.arange(n_questions), n_waves)
+    result = result[present.ravel()].sort_values("order", kind="stable").drop(columns="order")
+    print("wave comparison computed")
+    return result.reset_index(drop=True)
+
+def pairwise_corr(X, Y, weights=None):
+    """
+    Pearson correlation of every column of X with every column of Y, using
+    pairwise-complete observations like DataFrame.corr(). Everything is computed
+    with masked matrix products, so correlating Q questions against a single
+    target is O(N*Q) rather than the O(N*Q^2) of the full matrix.
+    Optional row weights give weighted Pearson correlations.
+    Returns the correlations and the number of observations behind each one.
+    """
+    mask_x = ~np.isnan(X)
+    mask_y = ~np.isnan(Y)
+    X0 = np.where(mask_x, X, 0.0)
+    Y0 = np.where(mask_y, Y, 0.0)
+    mask_x = mask_x.astype(float)
+    mask_y = mask_y.astype(float)
+    observations = mask_x.T @ mask_y
+
+    # Weighting the X side of every product weights each row once
+    if weights is not None:
+        w = np.nan_to_num(np.asarray(weights, dtype=float))[:, None]
+        wmask_x, wX0 = mask_x * w, X0 * w
+    else:
+        wmask_x, wX0 = mask_x, X0
+
+    n = wmask_x.T @ mask_y
+    sum_x = wX0.T @ mask_y
+    sum_y = wmask_x.T @ Y0
+    sum_xx = (wX0 * X0).T @ mask_y
+    sum_yy = wmask_x.T @ (Y0 ** 2)
+    sum_xy = wX0.T @ Y0
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = sum_xy - sum_x * sum_y / n
+        var_x = sum_xx - sum_x ** 2 / n
+        var_y = sum_yy - sum_y ** 2 / n
+        # With fractional weights a constant column is left with a rounding residue
+        # instead of zero variance; treat it as constant so its correlations are NaN
+        var_x[var_x <= 1e-12 * np.abs(sum_xx)] = np.nan
+        var_y[var_y <= 1e-12 * np.abs(sum_yy)] = np.nan
+        corr = np.clip(cov / np.sqrt(var_x * var_y), -1.0, 1.0)
+    corr[observations < 2] = np.nan
+    return corr, observations
+
+def standardized_betas(X, y, weights=None):
+    """
+    Standardized (weighted) least squares regression weights of y on the columns
+    of X, fitted on the respondents who answered every question. Constant columns get NaN.
+    """
+    betas = np.full(X.shape[1], np.nan)
+    w = np.ones(len(y)) if weights is None else np.nan_to_num(np.asarray(weights, dtype=float))
+    complete = ~np.isnan(X).any(axis=1) & ~np.isnan(y) & (w > 0)
+    Xc, yc, wc = X[complete], y[complete], w[complete]
+    if len(yc) == 0:
+        return betas
+    mean_x = np.average(Xc, axis=0, weights=wc)
+    sd_x = np.sqrt(np.average((Xc - mean_x) ** 2, axis=0, weights=wc))
+    mean_y = np.average(yc, weights=wc)
+    sd_y = np.sqrt(np.average((yc - mean_y) ** 2, weights=wc))
+    # Relative to the mean, since fractional weights leave constant columns a tiny sd
+    keep = sd_x > 1e-9 * np.maximum(1, np.abs(mean_x))
+    if len(yc) <= keep.sum() or sd_y <= 1e-9 * max(1, abs(mean_y)):
+        return betas
+    root_w = np.sqrt(wc)[:, None]
+    Z = (Xc[:, keep] - mean_x[keep]) / sd_x[keep] * root_w
+    zy = (yc - mean_y) / sd_y * root_w[:, 0]
+    betas[keep] = np.linalg.lstsq(Z, zy, rcond=None)[0]
+    return betas
+
+def summarize(filename, question, group_filter=None, themes=None, **filters):
     """
     Process the CSV file with filtering/grouping via PreProcess,
     then extract responses for the specified question and pass them
     to the completion API for summarization.
+    With themes, the answers are first clustered locally into that many themes
+    and only one representative answer per theme is sent.
     """
     # Instantiate PreProcess to apply filters (and group_filter if provided)
     PP = PreProcess(filename, group_filter=group_filter, **filters)
@@ -166,12 +599,25 @@ def summarize(filename, question, group_filter=None, **filters):
     if df_question.empty:
         raise ValueError(f"No responses found for question: {question}")
     
-    answers_list = df_question[question].tolist()
-    # Combine responses into one string, each on a new line
-    answers = "\n".join(str(answer) for answer in answers_list)
+    if themes:
+        from app.themes import build_themes
+        clusters = build_themes(PP.original_df, question, n_themes=themes, top_n=5)["themes"]
+        answers = "\n".join(
+            f"[Theme {theme['theme']}: {theme['share']:.0%} of responses, key terms: {', '.join(theme['top_terms'])}] "
+            f"{theme['representative']}"
+            for theme in clusters
+        )
+        answers = (
+            "Responses were grouped into themes of similar answers; each line is one representative "
+            f"answer per theme.\n{answers}"
+        )
+    else:
+        answers_list = df_question[question].tolist()
+        # Combine responses into one string, each on a new line
+        answers = "\n".join(str(answer) for answer in answers_list)
     
     # Create the completion request with the extracted responses
-    response = client.responses.create(
+    response = get_client().responses.create(
         model="gpt-4o",
         input=[
             {
@@ -215,10 +661,10 @@ def get_responses(form_id):
     endpoint = f"/forms/{form_id}/responses?page_size=1000"
     all_responses = []
     url = base_url + endpoint
-    headers = {"Authorization": f"Bearer {TYPEFORM_API_KEY}"}
+    session = get_typeform_session()
 
     while url:
-        r = requests.get(url, headers=headers)
+        r = session.get(url)
         data = r.json()
         all_responses.extend(data["items"])
         url = data.get("_links", {}).get("next")  # paginate
@@ -227,12 +673,12 @@ def get_responses(form_id):
 
 def get_form(form_id):
     endpoint = f"/forms/{form_id}"
-    r = requests.get(base_url + endpoint, headers={"Authorization": f"Bearer {TYPEFORM_API_KEY}"})
+    r = get_typeform_session().get(base_url + endpoint)
     return r.json()
 
 def get_typeforms():
     endpoint = "/forms?page_size=200"
-    r = requests.get(base_url + endpoint, headers={"Authorization": f"Bearer {TYPEFORM_API_KEY}"})
+    r = get_typeform_session().get(base_url + endpoint)
     return r.json()
 
 def clean(text):
@@ -265,6 +711,42 @@ def build_csv_from_typeform(form_id):
     df = pd.DataFrame(rows)
     return json.loads(df.to_json(orient="records"))
 
-
-
-
+def warm_up():
+    """
+    Pay the one-off costs of the first request ahead of time: import the heavy
+    modules, construct the API clients and run a small synthetic survey through
+    the counts, correlation, driver, interval and theme code paths.
+    """
+    import tempfile
+    from app.themes import build_themes
+
+    try:
+        get_client()
+        get_typeform_session()
+    except Exception as e:
+        # A missing key only breaks the routes that need that client
+        print(f"Could not construct API clients during warm up: {e}")
+
+    rng = np.random.default_rng(0)
+    n = 50
+    df = pd.DataFrame({
+        "#": [f"warm{i}" for i in range(n)],
+        "Weight": rng.uniform(0.5, 2, n),
+        "Q1": rng.integers(0, 11, n),
+        "Q2": rng.integers(0, 11, n),
+        "Comments": rng.choice(["great team", "low pay", "too much work"], n),
+    })
+    fd, filename = tempfile.mkstemp(suffix=".csv")
+    os.close(fd)
+    try:
+        df.to_csv(filename, index=False)
+        PP = PreProcess(filename, group_filter={"question": "Q1", "group": "Low"}, weight_column="Weight")
+        PP.count_data(ci="bootstrap", n_boot=100)
+        PP.count_data(ci="analytic")
+        PP.correlate_data()
+        PP.driver_data("Q1", regression=True)
+        PreProcess(filename).count_data()
+        build_themes(PP.original_df, "Comments", n_themes=2, segment_by="Q2")
+    finally:
+        os.remove(filename)
+    print("warm up done")
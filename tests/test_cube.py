@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.cube import AggregateCube
+from app.utils import PreProcess
+
+
+@pytest.fixture
+def survey_csv(tmp_path):
+    rng = np.random.default_rng(11)
+    n = 150
+    df = pd.DataFrame({
+        "#": [f"r{i}" for i in range(n)],
+        "Network ID": ["x"] * n,
+        "Gender": rng.choice(["Male", "Female", None], n),
+        "Age": rng.integers(20, 60, n),
+        "Team": rng.integers(1, 4, n),
+        "Q1 ": rng.integers(0, 11, n).astype(float),
+        "Q2": rng.integers(0, 11, n),
+        "Score": rng.uniform(-1, 12, n).round(1),
+        "Comments": rng.choice(["great", "bad", "7"], n),
+    })
+    df.loc[::9, "Q1 "] = np.nan
+    filename = tmp_path / "survey.csv"
+    df.to_csv(filename, index=False)
+    return str(filename)
+
+
+@pytest.mark.parametrize("filters, group_filter", [
+    ({}, None),
+    ({"Gender": {"operator": "=", "value": "Female"}}, None),
+    ({"Gender": {"operator": "!=", "value": "Female"}}, None),
+    ({"Not a column": {"operator": ">", "value": 1}}, None),
+    ({}, {"question": "Q1", "group": "Low"}),
+    ({}, {"question": "Q2", "group": "Mod"}),
+    ({}, {"question": "Score", "group": "High"}),
+])
+def test_cube_matches_row_level_histograms(survey_csv, filters, group_filter):
+    cube = AggregateCube(PreProcess(survey_csv).original_df)
+    expected = PreProcess(survey_csv, group_filter=group_filter, **filters).histogram()
+    pd.testing.assert_frame_equal(cube.histogram(filters, group_filter), expected)
+
+
+@pytest.mark.parametrize("filters, group_filter", [
+    ({"Age": {"operator": ">=", "value": 30}}, None),
+    ({"Gender": {"operator": "=", "value": "Female"}, "Team": {"operator": "=", "value": 1}}, None),
+    ({"Gender": {"operator": "=", "value": "Female"}}, {"question": "Q1", "group": "Low"}),
+    ({"Gender": {"operator": "=", "value": "Unknown"}}, None),
+    # Question columns are sliced with group filters instead
+    ({"Team": {"operator": "=", "value": 2}}, None),
+    ({"Q2": {"operator": "!=", "value": 10}}, None),
+    ({}, {"question": "Comments", "group": "Low"}),
+])
+def test_cube_declines_queries_it_cannot_answer(survey_csv, filters, group_filter):
+    cube = AggregateCube(PreProcess(survey_csv).original_df)
+    assert cube.histogram(filters, group_filter) is None
+
+
+def test_cube_levels_leave_out_questions(survey_csv):
+    cube = AggregateCube(PreProcess(survey_csv).original_df)
+    assert list(cube.levels) == ["Gender"]
+    with pytest.raises(ValueError):
+        AggregateCube(PreProcess(survey_csv).original_df, max_bytes=1000)
+
+
+def test_cube_requires_unique_respondents():
+    df = pd.DataFrame({"#": ["a", "a"], "Q1": [1, 2]})
+    with pytest.raises(ValueError):
+        AggregateCube(df)
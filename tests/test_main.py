@@ -119,4 +119,140 @@ def test_unauthorized_access(sample_csv):
             files={"file": ("test.csv", f, "text/csv")}
         )
     assert response.status_code == 401
-    assert "Invalid API key" in response.json()["detail"] 
\ No newline at end of file
+    assert "Invalid API key" in response.json()["detail"] 
+
+def test_driver_analysis(auth_client):
+    df = pd.DataFrame({
+        '#': ["a", "b", "c", "d", "e"],
+        'Outcome': [1, 4, 6, 8, 10],
+        'Question 1': [2, 3, 7, 7, 9],
+        'Question 2': [9, 2, 5, 1, 4]
+    })
+    filename = "test_driver.csv"
+    df.to_csv(filename, index=False)
+    try:
+        with open(filename, "rb") as f:
+            response = auth_client(
+                "POST",
+                "/driver_analysis",
+                files={"file": ("test.csv", f, "text/csv")},
+                params={"target": "Outcome", "top_k": 1}
+            )
+        assert response.status_code == 200
+        data = response.json()
+        assert len(data) == 1
+        assert data[0]["Question"] == "Question 1"
+    finally:
+        if os.path.exists(filename):
+            os.remove(filename)
+
+def test_compare_waves(auth_client):
+    wave_1 = pd.DataFrame({
+        '#': [f"a{i}" for i in range(40)],
+        'Engaged ': [2] * 30 + [9] * 10,
+        'Only in wave 1': [5] * 40,
+    })
+    wave_2 = pd.DataFrame({
+        '#': [f"b{i}" for i in range(40)],
+        'Engaged': [2] * 10 + [9] * 30,
+    })
+    response = auth_client(
+        "POST",
+        "/datasets",
+        files={"file": ("wave_1.csv", wave_1.to_csv(index=False).encode(), "text/csv")}
+    )
+    assert response.status_code == 200
+    dataset_id = response.json()["dataset_id"]
+    assert response.json()["name"] == "wave_1.csv"
+
+    response = auth_client(
+        "POST",
+        "/compare_waves",
+        files=[("files", ("wave_2.csv", wave_2.to_csv(index=False).encode(), "text/csv"))],
+        params={"dataset_ids": [dataset_id]}
+    )
+    assert response.status_code == 200
+    rows = {(row["Question"], row["Wave"]): row for row in response.json()}
+    assert rows[("Engaged", "1: wave_1.csv")]["High_Delta"] is None
+    assert rows[("Engaged", "2: wave_2.csv")]["High_Delta"] == 0.5
+    assert rows[("Engaged", "2: wave_2.csv")]["High_Significant"] is True
+    assert ("Only in wave 1", "1: wave_1.csv") in rows
+    assert ("Only in wave 1", "2: wave_2.csv") not in rows
+
+    # Waves uploaded under the same file name get distinct labels
+    response = auth_client(
+        "POST",
+        "/compare_waves",
+        files=[
+            ("files", ("survey.csv", wave_1.iloc[:20].to_csv(index=False).encode(), "text/csv")),
+            ("files", ("survey.csv", wave_2.iloc[:20].to_csv(index=False).encode(), "text/csv")),
+        ]
+    )
+    assert response.status_code == 200
+    assert {row["Wave"] for row in response.json()} == {"1: survey.csv", "2: survey.csv"}
+
+def test_compare_waves_needs_two_waves(auth_client):
+    response = auth_client("POST", "/compare_waves", params={"dataset_ids": ["missing"]})
+    assert response.status_code == 400
+    response = auth_client("POST", "/compare_waves", params={"dataset_ids": ["missing", "also missing"]})
+    assert response.status_code == 404
+
+def test_themes(auth_client):
+    df = pd.DataFrame({
+        '#': ["a", "b", "c", "d"],
+        'Comments': ["Low pay", "The pay is low", "Great team", "My team is great"]
+    })
+    response = auth_client(
+        "POST",
+        "/themes",
+        files={"file": ("test.csv", df.to_csv(index=False).encode(), "text/csv")},
+        params={"question": "Comments", "n_themes": 2}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["n_responses"] == 4
+    assert len(data["themes"]) == 2
+
+    response = auth_client("POST", "/themes", params={"question": "Comments"})
+    assert response.status_code == 400
+
+def test_create_counts_table_from_stored_dataset(auth_client, monkeypatch):
+    df = pd.DataFrame({
+        '#': [f"r{i}" for i in range(12)],
+        'Gender': ["Female", "Male"] * 6,
+        'Age': [25, 35, 45] * 4,
+        'Question 1': [0, 3, 6, 7, 8, 9, 10, 2, 5, 9, 9, 1],
+        'Question 2': [10, 9, 8, 7, 6, 5, 4, 3, 2, 1, 0, 10],
+    })
+    content = df.to_csv(index=False).encode()
+    response = auth_client(
+        "POST",
+        "/datasets",
+        files={"file": ("survey.csv", content, "text/csv")}
+    )
+    dataset_id = response.json()["dataset_id"]
+
+    for params in [
+        {"filters": "Gender = Female"},
+        {"group_filter": "Question 1:High"},
+        {"filters": "Gender = Female; Age >= 30"},
+    ]:
+        stored = auth_client("POST", "/create_counts_table", params={"dataset_id": dataset_id, **params})
+        uploaded = auth_client(
+            "POST",
+            "/create_counts_table",
+            files={"file": ("survey.csv", content + b"\n", "text/csv")},
+            params=params
+        )
+        assert stored.status_code == 200
+        assert stored.json() == uploaded.json()
+
+    response = auth_client("POST", "/create_counts_table", params={"dataset_id": "missing"})
+    assert response.status_code == 404
+
+    # Queries answered from the cube never read (or rehash) the stored content
+    def fail(dataset_id):
+        raise AssertionError("stored content was read")
+    monkeypatch.setattr("app.main.datasets.get", fail)
+    response = auth_client("POST", "/create_counts_table", params={"dataset_id": dataset_id, "filters": "Gender = Male"})
+    assert response.status_code == 200
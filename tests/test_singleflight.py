@@ -0,0 +1,68 @@
+import asyncio
+import threading
+import time
+import pytest
+
+from app.singleflight import SingleFlight
+
+
+def test_concurrent_duplicates_share_one_computation():
+    flight = SingleFlight()
+    calls = []
+    lock = threading.Lock()
+
+    def compute(value):
+        with lock:
+            calls.append(value)
+        time.sleep(0.1)
+        return {"value": value}
+
+    async def run():
+        return await asyncio.gather(
+            flight.do(("abc", "summarize", "{}"), compute, 1),
+            flight.do(("abc", "summarize", "{}"), compute, 1),
+            flight.do(("abc", "summarize", "{}"), compute, 1),
+        )
+
+    results = asyncio.run(run())
+    assert calls == [1]
+    assert results == [{"value": 1}] * 3
+    assert len(flight) == 0
+
+
+def test_different_keys_compute_separately():
+    flight = SingleFlight()
+    calls = []
+
+    def compute(value):
+        calls.append(value)
+        time.sleep(0.05)
+        return value
+
+    async def run():
+        return await asyncio.gather(
+            flight.do(("abc", "create_counts_table", "{}"), compute, 1),
+            flight.do(("abc", "create_correlation_matrix", "{}"), compute, 2),
+        )
+
+    assert asyncio.run(run()) == [1, 2]
+    assert sorted(calls) == [1, 2]
+
+
+def test_errors_propagate_to_every_waiter_and_release_key():
+    flight = SingleFlight()
+
+    def compute():
+        time.sleep(0.05)
+        raise ValueError("boom")
+
+    async def run():
+        return await asyncio.gather(
+            flight.do("key", compute),
+            flight.do("key", compute),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, ValueError) for r in results)
+    assert len(flight) == 0
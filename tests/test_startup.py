@@ -0,0 +1,53 @@
+import os
+import subprocess
+import sys
+import pytest
+from fastapi.testclient import TestClient
+
+import app.utils as utils
+from app.main import app
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["pandas", "numpy", "scipy", "openai", "requests"]
+# Generous default so slow CI machines pass; tighten locally with IMPORT_TIME_BUDGET
+IMPORT_TIME_BUDGET = float(os.getenv("IMPORT_TIME_BUDGET", "3.0"))
+
+
+def test_import_time_and_deferred_dependencies():
+    code = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        "import app.main\n"
+        "print(time.perf_counter() - start)\n"
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))\n"
+    )
+    env = {key: value for key, value in os.environ.items() if key not in ("API_KEY", "OPENAI_API_KEY")}
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    elapsed, loaded = result.stdout.splitlines()[-2:]
+    print(f"import app.main took {float(elapsed):.3f}s")
+    assert loaded == ""
+    assert float(elapsed) < IMPORT_TIME_BUDGET
+
+
+def test_clients_are_lazy_singletons(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-openai-key")
+    monkeypatch.setattr(utils, "_client", None)
+    monkeypatch.setattr(utils, "_typeform_session", None)
+    assert utils.get_client() is utils.get_client()
+    assert utils.get_typeform_session() is utils.get_typeform_session()
+
+
+def test_warm_up_runs_before_serving(monkeypatch):
+    calls = []
+    monkeypatch.setenv("WARM_UP", "1")
+    monkeypatch.setattr(utils, "warm_up", lambda: calls.append("warm"))
+    with TestClient(app):
+        assert calls == ["warm"]
+
+
+def test_warm_up_exercises_hot_paths(monkeypatch):
+    monkeypatch.setattr(utils, "get_client", lambda: None)
+    monkeypatch.setattr(utils, "get_typeform_session", lambda: None)
+    utils.warm_up()
@@ -0,0 +1,64 @@
+import pytest
+
+from app.store import DatasetStore
+
+
+def test_add_is_keyed_by_content():
+    store = DatasetStore()
+    first = store.add(b"#,Q1\na,1\n", name="wave_1.csv")
+    assert store.add(b"#,Q1\na,1\n") == first
+    assert len(store) == 1
+    assert store.get(first) == b"#,Q1\na,1\n"
+    assert store.name(first) == "wave_1.csv"
+
+
+def test_cached_computes_once_per_key():
+    store = DatasetStore()
+    dataset_id = store.add(b"data")
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return len(calls)
+
+    assert store.cached(dataset_id, "histogram", compute) == 1
+    assert store.cached(dataset_id, "histogram", compute) == 1
+    assert store.cached(dataset_id, "themes", compute) == 2
+
+
+def test_least_recently_used_dataset_is_evicted():
+    store = DatasetStore(max_datasets=2)
+    first = store.add(b"1")
+    second = store.add(b"2")
+    store.get(first)
+    store.add(b"3")
+    assert first in store
+    assert second not in store
+    with pytest.raises(KeyError):
+        store.get(second)
+
+
+def test_transient_uploads_do_not_evict_pinned_datasets():
+    store = DatasetStore(max_datasets=2, max_transient=1)
+    pinned = [store.add(b"1"), store.add(b"2")]
+    first = store.add(b"3", pinned=False)
+    second = store.add(b"4", pinned=False)
+    assert all(dataset_id in store for dataset_id in pinned)
+    assert first not in store
+    assert second in store
+    # Saving a transient upload pins it
+    store.add(b"4")
+    assert second in store
+    assert pinned[0] not in store
+
+
+def test_cache_is_bounded_per_dataset():
+    store = DatasetStore(max_cached=2)
+    dataset_id = store.add(b"data")
+    store.cached(dataset_id, "cube", lambda: "cube", evictable=False)
+    for key in ("a", "b", "c"):
+        store.cached(dataset_id, key, lambda: key)
+    assert store.peek(dataset_id, "a") is None
+    assert store.peek(dataset_id, "c") == "c"
+    # Aggregates kept for the dataset's lifetime do not count towards the bound
+    assert store.peek(dataset_id, "cube") == "cube"
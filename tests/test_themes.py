@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.themes import build_themes, spherical_kmeans, term_document_matrix, tokenize
+
+
+@pytest.fixture
+def comments():
+    pay = ["The pay is too low", "Pay is low for the work", "Low pay and no raise", "I want better pay"]
+    team = ["My team is great", "Great team and supportive manager", "I love my team", "The team is supportive"]
+    df = pd.DataFrame({
+        "#": [f"r{i}" for i in range(10)],
+        "Department": ["Sales"] * 4 + ["Ops"] * 4 + ["Sales", "Ops"],
+        "Comments": pay + team + ["", "the and of"],
+    })
+    return df
+
+
+def test_tokenize_drops_stop_words():
+    assert tokenize("The pay is TOO low!") == ["pay", "low"]
+
+
+def test_term_document_matrix_rows_are_normalized():
+    matrix, terms = term_document_matrix(["low pay", "low pay again", "great team", "great team mates"])
+    assert "low pay" in terms
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1))).ravel()
+    np.testing.assert_allclose(norms, 1.0)
+
+
+def test_spherical_kmeans_separates_disjoint_vocabularies():
+    matrix, _ = term_document_matrix(["low pay", "pay low", "low pay raise", "great team", "team great", "great team fun"])
+    labels, _, similarity = spherical_kmeans(matrix, 2)
+    assert len(set(labels[:3])) == 1
+    assert len(set(labels[3:])) == 1
+    assert labels[0] != labels[3]
+    assert (similarity > 0).all()
+
+
+def test_build_themes(comments):
+    result = build_themes(comments, "Comments", n_themes=2, top_n=3, segment_by="Department")
+    assert result["n_responses"] == 9
+    assert [theme["theme"] for theme in result["themes"]] == [1, 2]
+    assert sum(theme["size"] for theme in result["themes"]) == 8
+    top = {term for theme in result["themes"] for term in theme["top_terms"][:1]}
+    assert top == {"pay", "team"}
+    for theme in result["themes"]:
+        assert theme["representative"] == theme["examples"][0]
+    segments = {segment["segment"]: segment for segment in result["segments"]}
+    assert segments["Sales"]["top_terms"][0] == "pay"
+    assert segments["Ops"]["top_terms"][0] == "team"
+
+
+def test_build_themes_unknown_question(comments):
+    with pytest.raises(ValueError):
+        build_themes(comments, "Not a question")
@@ -0,0 +1,218 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.utils import PreProcess, summarize, pairwise_corr, compare_waves, CI_STATS, analytic_intervals, bootstrap_intervals, MAX_BOOTSTRAP_RESAMPLES, standardized_betas
+
+
+@pytest.fixture
+def survey_csv(tmp_path):
+    rng = np.random.default_rng(7)
+    n = 120
+    q1 = rng.integers(0, 11, n)
+    df = pd.DataFrame({
+        "#": [f"r{i}" for i in range(n)],
+        "Gender": rng.choice(["Male", "Female"], n),
+        "I am excited to work most days. ": q1,
+        "Q2": np.clip(q1 + rng.integers(-1, 2, n), 0, 10),
+        "Q3": rng.integers(0, 11, n),
+        "Q4": np.clip(10 - q1 + rng.integers(-3, 4, n), 0, 10),
+    })
+    filename = tmp_path / "survey.csv"
+    df.to_csv(filename, index=False)
+    return str(filename)
+
+
+def test_pairwise_corr_matches_pandas_with_missing_values():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(50, 4))
+    X[rng.random(X.shape) < 0.2] = np.nan
+    corr, n = pairwise_corr(X, X)
+    expected = pd.DataFrame(X).corr().to_numpy()
+    np.testing.assert_allclose(corr, expected, atol=1e-10)
+    assert n[0, 0] == (~np.isnan(X[:, 0])).sum()
+
+
+def test_driver_data_matches_correlation_matrix_column(survey_csv):
+    target = "I am excited to work most days."
+    PP = PreProcess(survey_csv)
+    drivers = PP.driver_data(target)
+    full = PP.correlate_data()[target].drop(target)
+
+    assert target not in drivers["Question"].tolist()
+    for _, row in drivers.iterrows():
+        assert row["Correlation"] == pytest.approx(full[row["Question"]])
+    # Sorted by strength, strongest first
+    strengths = drivers["Correlation"].abs().tolist()
+    assert strengths == sorted(strengths, reverse=True)
+    assert drivers.iloc[0]["Question"] == "Q2"
+
+
+def test_driver_data_top_k_and_regression(survey_csv):
+    PP = PreProcess(survey_csv)
+    drivers = PP.driver_data("I am excited to work most days.", top_k=2, regression=True)
+    assert len(drivers) == 2
+    assert list(drivers.columns) == ["Question", "Correlation", "N", "Beta"]
+    assert drivers["Beta"].notna().all()
+
+
+def test_driver_data_unknown_target(survey_csv):
+    with pytest.raises(ValueError):
+        PreProcess(survey_csv).driver_data("Not a question")
+
+
+def test_count_data_without_ci_is_unchanged(survey_csv):
+    table = PreProcess(survey_csv).count_data()
+    assert "NPS" not in table.columns
+    assert "Low_Lower" not in table.columns
+
+
+@pytest.mark.parametrize("ci", ["bootstrap", "analytic"])
+def test_count_data_confidence_intervals_bracket_estimates(survey_csv, ci):
+    table = PreProcess(survey_csv).count_data(ci=ci, n_boot=2000)
+    for stat in CI_STATS:
+        assert (table[f"{stat}_Lower"] <= table[stat] + 0.01).all()
+        assert (table[f"{stat}_Upper"] >= table[stat] - 0.01).all()
+        assert (table[f"{stat}_Lower"] < table[f"{stat}_Upper"]).all()
+    assert table["NPS"].tolist() == pytest.approx((table["High"] - table["Low"]).tolist(), abs=0.011)
+
+
+def test_bootstrap_intervals_agree_with_analytic_and_are_reproducible():
+    counts = np.array([[5, 3, 4, 6, 8, 10, 12, 15, 20, 9, 8], [0] * 11], dtype=float)
+    analytic = analytic_intervals(counts)
+    serial = bootstrap_intervals(counts, n_boot=4000, seed=1)
+    assert bootstrap_intervals(counts, n_boot=4000, seed=1)["Avg"][0] == pytest.approx(serial["Avg"][0])
+    parallel = bootstrap_intervals(counts, n_boot=4000, n_jobs=2, seed=1)
+    for bounds in (serial, parallel):
+        for stat in CI_STATS:
+            np.testing.assert_allclose(bounds[stat][0][0], analytic[stat][0][0], atol=0.05 if stat != "Avg" else 0.2)
+            np.testing.assert_allclose(bounds[stat][1][0], analytic[stat][1][0], atol=0.05 if stat != "Avg" else 0.2)
+            # An empty question has degenerate intervals rather than NaN
+            assert bounds[stat][0][1] == 0 and bounds[stat][1][1] == 0
+    with pytest.raises(ValueError):
+        bootstrap_intervals(counts, n_boot=MAX_BOOTSTRAP_RESAMPLES + 1)
+
+
+def test_weighted_results_match_expanded_rows(tmp_path):
+    rng = np.random.default_rng(3)
+    n = 60
+    df = pd.DataFrame({
+        "#": [f"r{i}" for i in range(n)],
+        "Weight": rng.integers(1, 4, n),
+        "Q1": rng.integers(0, 11, n),
+        "Q2": rng.integers(0, 11, n).astype(float),
+        "Q3": rng.integers(0, 11, n),
+    })
+    df.loc[::7, "Q2"] = np.nan
+    weighted_csv = tmp_path / "weighted.csv"
+    df.to_csv(weighted_csv, index=False)
+
+    expanded = df.loc[df.index.repeat(df["Weight"])].drop(columns=["Weight"])
+    expanded["#"] = [f"e{i}" for i in range(len(expanded))]
+    expanded_csv = tmp_path / "expanded.csv"
+    expanded.to_csv(expanded_csv, index=False)
+
+    weighted = PreProcess(str(weighted_csv), weight_column="Weight")
+    unweighted = PreProcess(str(expanded_csv))
+
+    pd.testing.assert_frame_equal(
+        weighted.count_data().drop(columns=range(0, 11)),
+        unweighted.count_data().drop(columns=range(0, 11)),
+        check_dtype=False,
+    )
+    np.testing.assert_allclose(weighted.histogram().to_numpy(), unweighted.histogram().to_numpy())
+    np.testing.assert_allclose(
+        weighted.correlate_data().to_numpy(), unweighted.correlate_data().to_numpy(), atol=1e-10
+    )
+    weighted_drivers = weighted.driver_data("Q1", regression=True)
+    expanded_drivers = unweighted.driver_data("Q1", regression=True)
+    np.testing.assert_allclose(weighted_drivers["Correlation"], expanded_drivers["Correlation"], atol=1e-10)
+    np.testing.assert_allclose(
+        weighted_drivers["Beta"].astype(float), expanded_drivers["Beta"].astype(float), atol=1e-10
+    )
+
+
+def test_weighted_correlations_of_constant_columns_are_nan(tmp_path):
+    rng = np.random.default_rng(5)
+    n = 80
+    df = pd.DataFrame({
+        "#": [f"r{i}" for i in range(n)],
+        "Weight": rng.uniform(0.2, 3, n),
+        "Q1": rng.integers(0, 11, n),
+        "Q2": rng.integers(0, 11, n),
+        "Const": [5] * n,
+        "Const7": [7] * n,
+    })
+    filename = tmp_path / "constant.csv"
+    df.to_csv(filename, index=False)
+    corr = PreProcess(str(filename), weight_column="Weight").correlate_data()
+    for const in ("Const", "Const7"):
+        assert corr[const].isna().all()
+        assert corr.loc[const].isna().all()
+    assert not np.isnan(corr.loc["Q1", "Q2"])
+
+    # Constant drivers are dropped in weighted mode too and do not get a beta
+    drivers = PreProcess(str(filename), weight_column="Weight").driver_data("Q1", regression=True)
+    assert drivers["Question"].tolist() == ["Q2"]
+    np.testing.assert_allclose(
+        standardized_betas(df[["Const", "Q2"]].to_numpy(float), df["Q1"].to_numpy(float), df["Weight"])[0], np.nan
+    )
+
+
+def test_weighted_intervals_use_effective_sample_size(tmp_path):
+    df = pd.DataFrame({"#": ["a", "b", "c", "d"], "Weight": [100, 100, 100, 100], "Q1": [2, 8, 9, 10]})
+    filename = tmp_path / "weights.csv"
+    df.to_csv(filename, index=False)
+    PP = PreProcess(str(filename), weight_column="Weight")
+    assert PP.sample_sizes()["Q1"] == pytest.approx(4)
+    table = PP.count_data(ci="analytic")
+    # Four respondents give wide intervals, whatever the scale of the weights
+    assert table.loc[0, "High_Upper"] - table.loc[0, "High_Lower"] > 0.5
+
+
+def test_weight_column_must_exist(survey_csv):
+    with pytest.raises(ValueError):
+        PreProcess(survey_csv, weight_column="Weight")
+
+
+def test_compare_waves_aligns_questions_and_flags_changes():
+    index = pd.Index(["Engaged", "Stable"], name="Question")
+    wave_1 = pd.DataFrame([[30] + [0] * 8 + [10, 0], [0] * 5 + [50] + [0] * 5], index=index, columns=range(11))
+    wave_2 = pd.DataFrame([[10] + [0] * 8 + [30, 0]], index=index[:1], columns=range(11))
+    wave_3 = pd.DataFrame([[10] + [0] * 8 + [30, 0], [0] * 5 + [50] + [0] * 5], index=index, columns=range(11))
+    sizes = [hist.sum(axis=1) for hist in (wave_1, wave_2, wave_3)]
+
+    result = compare_waves([wave_1, wave_2, wave_3], sizes, ["Q1", "Q2", "Q3"])
+    assert result["Question"].tolist() == ["Engaged"] * 3 + ["Stable"] * 2
+    engaged = result[result["Question"] == "Engaged"].set_index("Wave")
+    assert engaged.loc["Q1", "High_Delta"] is None
+    assert engaged.loc["Q2", "High_Delta"] == pytest.approx(0.5)
+    assert engaged.loc["Q2", "High_Significant"]
+    assert not engaged.loc["Q3", "High_Significant"]
+    # Stable skips the wave it was missing from and is compared with Q1
+    stable = result[result["Question"] == "Stable"].set_index("Wave")
+    assert stable.loc["Q3", "Avg_Delta"] == 0
+    assert not stable.loc["Q3", "Avg_Significant"]
+
+
+def test_summarize_with_themes_sends_one_answer_per_theme(tmp_path, monkeypatch):
+    df = pd.DataFrame({
+        "#": [f"r{i}" for i in range(6)],
+        "Comments": ["Low pay", "The pay is low", "pay too low", "Great team", "My team is great", "great team"],
+    })
+    filename = tmp_path / "comments.csv"
+    df.to_csv(filename, index=False)
+    sent = []
+
+    class FakeResponses:
+        def create(self, **kwargs):
+            sent.append(kwargs["input"][1]["content"][0]["text"])
+            content = type("Content", (), {"text": "summary"})
+            output = type("Output", (), {"content": [content]})
+            return type("Response", (), {"output": [output]})
+
+    fake_client = type("Client", (), {"responses": FakeResponses()})()
+    monkeypatch.setattr("app.utils.get_client", lambda: fake_client)
+    assert json.loads(summarize(str(filename), "Comments", themes=2)) == "summary"
+    assert sent[0].count("[Theme ") == 2